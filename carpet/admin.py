@@ -5,4 +5,5 @@ admin.site.register([
     models.SynsetDef,
     models.Phrase,
     models.PhraseComposition,
+    models.SynsetClosure,
 ])
@@ -0,0 +1,163 @@
+"""Precomputed nearest synset definitions, see `SynsetClosure`."""
+
+from __future__ import annotations
+
+from collections import deque
+from itertools import islice
+from typing import Container, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from nltk.corpus.reader import Synset
+
+from carpet.index import SynsetKey, synset_key
+from carpet.models import Phrase, SynsetClosure, SynsetDef
+from carpet.wordnet import related_synset_levels, wordnet
+
+HYPERNYM = "@"
+HYPONYM = "~"
+
+
+def path_pointers(path: tuple[Synset, ...]) -> str:
+    """Pointer symbols leading along a path from `related_synset_levels`,
+    which starts with the found synset and ends with the searched one.
+    """
+    pointers = ""
+    for synset, related in zip(path[:0:-1], path[-2::-1]):
+        if related in synset._related(HYPERNYM, False):
+            pointers += HYPERNYM
+        else:
+            pointers += HYPONYM
+    return pointers
+
+
+def nearest_defined(
+    synset: Synset,
+    defined: Container[SynsetKey],
+    hypernym_search_depth: int,
+    hyponym_search_depth: int,
+) -> Optional[tuple[Synset, ...]]:
+    for level in related_synset_levels(
+        [(synset,)], hypernym_search_depth, hyponym_search_depth
+    ):
+        for path in level:
+            if synset_key(path[0]) in defined:
+                return path
+    return None
+
+
+def closure_of(
+    synset: Synset, defs: dict[SynsetKey, SynsetDef]
+) -> SynsetClosure:
+    closure = SynsetClosure(pos=synset.pos(), wn_offset=synset.offset())
+    path = nearest_defined(synset, defs, *settings.SYNSET_CLOSURE_DEPTHS)
+    if path is not None:
+        closure.synset_def = defs[synset_key(path[0])]
+        closure.pointers = path_pointers(path)
+        closure.hypernym_distance = closure.pointers.count(HYPERNYM)
+        closure.hyponym_distance = closure.pointers.count(HYPONYM)
+        closure.path = [s.name() for s in reversed(path)]
+    return closure
+
+
+def save_closures(
+    synsets: Iterable[Synset], batch_size=512, replace=False
+) -> None:
+    """Computes & saves the closures of synsets.
+    If `replace`, existing closures of the synsets are deleted first.
+    """
+    defs = {
+        (def_.pos, def_.wn_offset): def_
+        for def_ in SynsetDef.objects.only("pos", "wn_offset")
+    }
+    it = iter(synsets)
+    with transaction.atomic():
+        while batch := list(islice(it, batch_size)):
+            if replace:
+                SynsetClosure.objects.from_synsets(batch).delete()
+            SynsetClosure.objects.bulk_create(
+                closure_of(synset, defs) for synset in batch
+            )
+
+
+def affected_synsets(def_synsets: Iterable[Synset]) -> set[Synset]:
+    """Synsets whose closures may lead to any of `def_synsets`,
+    found by following pointers in reverse.
+    """
+    hypernym_depth, hyponym_depth = settings.SYNSET_CLOSURE_DEPTHS
+    affected = set()
+    seen = set()
+    queue = deque((synset, 0, 0) for synset in def_synsets)
+    while queue:
+        state = queue.popleft()
+        if state in seen:
+            continue
+        seen.add(state)
+        synset, ups, downs = state
+        affected.add(synset)
+        if ups < hypernym_depth:
+            queue.extend(
+                (related, ups + 1, downs)
+                for related in synset._related(HYPONYM, False)
+            )
+        if downs < hyponym_depth:
+            queue.extend(
+                (related, ups, downs + 1)
+                for related in synset._related(HYPERNYM, False)
+            )
+    return affected
+
+
+def refresh_closures(def_synsets: Iterable[Synset], batch_size=512) -> int:
+    """Recomputes the closures new definitions may have changed.
+    Does nothing if closures haven't been built yet.
+    """
+    if not SynsetClosure.objects.exists():
+        return 0
+    synsets = affected_synsets(def_synsets)
+    save_closures(synsets, batch_size, replace=True)
+    return len(synsets)
+
+
+def closest_defined(
+    synsets: list[Synset],
+    hypernym_search_depth: int,
+    hyponym_search_depth: int,
+) -> Optional[Tuple[Optional[Phrase], tuple[Synset, ...]]]:
+    """Answers a hypernym & hyponym search from `synsets`
+    with a single query.
+    Returns None if the closures can't tell,
+    in which case the search has to be run.
+    """
+    hypernym_depth, hyponym_depth = settings.SYNSET_CLOSURE_DEPTHS
+    if (
+        hypernym_search_depth > hypernym_depth
+        or hyponym_search_depth > hyponym_depth
+    ):
+        return None
+    closures = {
+        (closure.pos, closure.wn_offset): closure
+        for closure in SynsetClosure.objects.from_synsets(
+            synsets
+        ).select_related("synset_def__phrase")
+    }
+    best: Optional[SynsetClosure] = None
+    for synset in synsets:
+        closure = closures.get(synset_key(synset))
+        if closure is None:
+            return None
+        if closure.synset_def is None:
+            continue
+        if (
+            closure.hypernym_distance > hypernym_search_depth
+            or closure.hyponym_distance > hyponym_search_depth
+        ):
+            return None
+        # pointers compare in search order, ties go to earlier synsets
+        if best is None or closure.pointers < best.pointers:
+            best = closure
+    if best is None:
+        return None, tuple()
+    return best.synset_def.phrase.tree(), tuple(  # type: ignore
+        wordnet.synset(name) for name in reversed(best.path)
+    )
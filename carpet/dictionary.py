@@ -1,86 +1,375 @@
+from __future__ import annotations
+
 import warnings
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing import get_context
 from pathlib import Path
+from typing import Generator, Iterator, NamedTuple, Optional, Union
 
 import yaml
 from django.conf import settings
+from django.db import connections, transaction
 from django.db.utils import IntegrityError
 from jangle.models import LanguageTag
 from nltk.corpus.reader import Synset
 from yaml.error import MarkedYAMLError
 
-from carpet.models import SynsetDef
+from carpet.base import AbstractPhrase
+from carpet.index import SynsetKey
+from carpet.models import Phrase, PhraseComposition, SynsetDef
 from carpet.parser import StrPhrase
 from carpet.wordnet import wordnet
+from maas.models import lexeme_index
+
+DICTIONARY_SUFFIXES = (".yaml", ".yml")
+
+
+class SynsetRef(NamedTuple):
+    """A validated synset, which unlike `Synset` can be sent
+    between processes.
+    """
+
+    name: str
+    pos: str
+    offset: int
+
+    @classmethod
+    def from_synset(cls, synset: Synset) -> SynsetRef:
+        return cls(synset.name(), synset.pos(), synset.offset())
+
+    @property
+    def key(self) -> SynsetKey:
+        return self.pos, self.offset
+
+    def synset(self) -> Synset:
+        return wordnet.synset_from_pos_and_offset(self.pos, self.offset)
+
+    def __str__(self) -> str:
+        return f"Synset('{self.name}')"
+
+
+class DictionaryEntry(NamedTuple):
+    path: Path
+    phrase: StrPhrase
+    synsets: list[SynsetRef]
+    links: dict[str, SynsetRef]
+    """Synsets linked in the phrase, by name."""
+
+
+class DictionaryFile(NamedTuple):
+    requires: list[str]
+    entries: list[DictionaryEntry]
+
+
+def _linked_names(phrase: AbstractPhrase) -> Generator[str, None, None]:
+    if isinstance(phrase, StrPhrase):
+        if phrase.is_synset_linked and phrase.lexeme is None:
+            yield phrase.phrase_str
+            return
+        for child in phrase.children:
+            yield from _linked_names(child)
+
+
+def parse_entry(
+    path: Path, phrase: str, synset_names: list[str], lang: LanguageTag
+) -> DictionaryEntry:
+    assert isinstance(phrase, str)
+    assert isinstance(synset_names, list)
+    try:
+        carpet_phrase = StrPhrase(phrase, lang)
+        links = {
+            name: SynsetRef.from_synset(wordnet.synset(name))
+            for name in _linked_names(carpet_phrase)
+        }
+    except Exception as e:
+        raise ValueError(f"at '{path}'") from e
+    synsets = []
+    for name in synset_names:
+        assert isinstance(name, str)
+        try:
+            synset: Synset = wordnet.synset(name)  # type: ignore
+        except ValueError as e:
+            raise ValueError(f"synset '{name}'") from e
+        if synset.name() != name:
+            warnings.warn(
+                f"given name '{name}' at {path} does not match {synset}"
+            )
+        synsets.append(SynsetRef.from_synset(synset))
+    return DictionaryEntry(path, carpet_phrase, synsets, links)
+
+
+def parse_file(path: Path, lang: LanguageTag) -> DictionaryFile:
+    """Reads a dictionary file, parsing its phrases
+    and validating its synset names.
+    """
+    with path.open() as f:
+        try:
+            defs: dict = yaml.load(f.read(), settings.YAML_LOADER)
+        except MarkedYAMLError as e:
+            raise ValueError(f"invalid yaml file at {path}") from e
+    requires = defs.pop("requires", [])
+    for requirement in requires:
+        assert isinstance(requirement, str)
+    return DictionaryFile(
+        requires,
+        [
+            parse_entry(path, phrase, synset_names, lang)
+            for phrase, synset_names in defs.items()
+        ],
+    )
+
+
+def _parse_file_in_worker(
+    path: Path, lang: LanguageTag
+) -> tuple[Optional[DictionaryFile], list[str]]:
+    """Parses a file in a worker process,
+    returning warnings so they're shown in order.
+    Failed files give None, to be parsed again for their full errors.
+    """
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        try:
+            parsed = parse_file(path, lang)
+        except Exception:
+            parsed = None
+    return parsed, [str(w.message) for w in caught]
 
 
 class DictionaryLoader:
-    def __init__(self, lang: LanguageTag) -> None:
+    """Registers dictionary files, saving each phrase as it's read.
+    With `bulk`, phrases are only parsed and validated while registering,
+    and `write` saves them all at once.
+    With `workers`, which needs `bulk`, files are parsed
+    by a pool of processes.
+    """
+
+    def __init__(
+        self,
+        lang: LanguageTag,
+        bulk=False,
+        batch_size=512,
+        workers=0,
+    ) -> None:
+        if workers and not bulk:
+            raise ValueError("parsing in workers needs bulk loading")
         self.lang = lang
+        self.bulk = bulk
+        self.batch_size = batch_size
+        self.workers = workers
         self.registered_paths = []
+        self.defined: list[SynsetRef] = []
+        self.entries: list[DictionaryEntry] = []
+        """Entries registered in bulk mode and not written yet."""
+        self._parsed: dict[Path, tuple[DictionaryFile, list[str]]] = {}
+        """Files parsed by workers and not registered yet."""
+
+    @property
+    def defined_synsets(self) -> Iterator[Synset]:
+        """Synsets defined so far, looked up lazily,
+        as only closures need them.
+        """
+        return map(SynsetRef.synset, self.defined)
 
     def register(self, path: Path) -> None:
+        """Registers a dictionary file or directory
+        and the files they require.
+        With `workers`, files under `path` are parsed by a single pool first,
+        files required from elsewhere are parsed in this process.
+        """
+        if self.workers and path.is_dir():
+            self._parse_in_workers(path)
+        try:
+            self._register(path)
+        finally:
+            self._parsed.clear()
+
+    def _register(self, path: Path) -> None:
         if path in self.registered_paths:
             return
         if not path.exists():
             return
         if path.is_dir():
             for subpath in path.glob("*"):
-                self.register(subpath)
+                self._register(subpath)
         elif path.is_file():
-            if path.suffix not in (".yaml", ".yml"):
+            if path.suffix not in DICTIONARY_SUFFIXES:
                 warnings.warn(f"skipping {path}")
                 return
-            with path.open() as f:
-                try:
-                    defs: dict = yaml.load(f.read(), settings.YAML_LOADER)
-                except MarkedYAMLError as e:
-                    raise ValueError(f"invalid yaml file at {path}") from e
-                for requirement in defs.pop("requires", []):
-                    assert isinstance(requirement, str)
-                    req_path = (path.parent / requirement).resolve()
-                    self.register(req_path.with_suffix(".yaml"))
-                    self.register(req_path.with_suffix(".yml"))
-                for phrase, synset_names in defs.items():
-                    assert isinstance(phrase, str)
-                    assert isinstance(synset_names, list)
-                    carpet_phrase = StrPhrase(phrase, self.lang)
-                    try:
-                        phrase_obj = carpet_phrase.save()
-                    except Exception as e:
-                        raise ValueError(f"at '{path}'") from e
-                    for name in synset_names:
-                        assert isinstance(name, str)
-                        try:
-                            synset: Synset = wordnet.synset(name)  # type: ignore
-                        except ValueError as e:
-                            raise ValueError(f"synset '{name}'") from e
-                        if synset.name() != name:
-                            warnings.warn(
-                                f"given name '{name}' at {path} "
-                                f"does not match {synset}"
-                            )
-                        try:
-                            existing = SynsetDef.objects.get_from_synset(
-                                synset
-                            )
-                            raise IntegrityError(
-                                f"{synset} at {path} "
-                                f"already defined at {existing.source_file}"
-                            )
-                        except SynsetDef.DoesNotExist:
-                            pass
-                        def_ = SynsetDef(
-                            phrase=phrase_obj,
-                            pos=synset.pos(),
-                            wn_offset=synset.offset(),
-                            source_file=path.suffix,
-                        )
-                        try:
-                            def_.save()
-                        except IntegrityError as e:
-                            raise IntegrityError(
-                                f"synset def '{name}' at {path}"
-                            ) from e
+            if path in self._parsed:
+                parsed, messages = self._parsed.pop(path)
+                for message in messages:
+                    warnings.warn(message)
+            else:
+                parsed = parse_file(path, self.lang)
+            for requirement in parsed.requires:
+                req_path = (path.parent / requirement).resolve()
+                self._register(req_path.with_suffix(".yaml"))
+                self._register(req_path.with_suffix(".yml"))
+            for entry in parsed.entries:
+                if self.bulk:
+                    self.entries.append(entry)
+                else:
+                    self.save_entry(entry)
         else:
             raise ValueError(f"invalid path {path}")
         self.registered_paths.append(path)
+
+    def _parse_in_workers(self, path: Path) -> None:
+        """Parses the dictionary files under directory `path` in parallel,
+        for `_register` to go through in its usual order.
+        """
+        paths = sorted(
+            subpath
+            for subpath in path.rglob("*")
+            if subpath.is_file()
+            and subpath.suffix in DICTIONARY_SUFFIXES
+            and subpath not in self.registered_paths
+        )
+        if len(paths) < 2:
+            return
+        # loaded once here rather than in every worker
+        lexeme_index.lexemes
+        wordnet.ensure_loaded()
+        # forked workers must not share the parent's connection
+        connections.close_all()
+        with ProcessPoolExecutor(
+            self.workers, mp_context=get_context("fork")
+        ) as pool:
+            results = pool.map(_parse_file_in_worker, paths, repeat(self.lang))
+            for subpath, (parsed, messages) in zip(paths, results):
+                if parsed is not None:
+                    self._parsed[subpath] = parsed, messages
+
+    def save_entry(self, entry: DictionaryEntry) -> None:
+        try:
+            phrase_obj = entry.phrase.save()
+        except Exception as e:
+            raise ValueError(f"at '{entry.path}'") from e
+        for synset in entry.synsets:
+            try:
+                existing = SynsetDef.objects.get(
+                    pos=synset.pos, wn_offset=synset.offset
+                )
+                raise IntegrityError(
+                    f"{synset} at {entry.path} "
+                    f"already defined at {existing.source_file}"
+                )
+            except SynsetDef.DoesNotExist:
+                pass
+            def_ = SynsetDef(
+                phrase=phrase_obj,
+                pos=synset.pos,
+                wn_offset=synset.offset,
+                source_file=entry.path.suffix,
+            )
+            try:
+                def_.save()
+            except IntegrityError as e:
+                raise IntegrityError(
+                    f"synset def '{synset.name}' at {entry.path}"
+                ) from e
+            self.defined.append(synset)
+
+    def write(self) -> None:
+        """Saves the entries registered in bulk mode in a single transaction,
+        after checking for synsets defined more than once,
+        among them or in the database, and for undefined synset links.
+        """
+        entries, self.entries = self.entries, []
+        defined: dict[SynsetKey, tuple[SynsetRef, DictionaryEntry]] = {}
+        for entry in entries:
+            for synset in entry.synsets:
+                if synset.key in defined:
+                    raise IntegrityError(
+                        f"{synset} at {entry.path} "
+                        f"already defined at {defined[synset.key][1].path}"
+                    )
+                defined[synset.key] = synset, entry
+
+        phrases: list[Phrase] = []
+        compositions: list[PhraseComposition] = []
+        links: list[tuple[Phrase, SynsetRef, DictionaryEntry]] = []
+        """Phrases linked to a synset's phrase."""
+
+        def add(phrase: AbstractPhrase, entry: DictionaryEntry) -> Phrase:
+            obj = Phrase(
+                pitch_change=phrase.pitch_change,
+                multiplier=phrase.multiplier,
+                suffix=phrase.suffix,
+                count=phrase.count,
+                lexeme=phrase.lexeme,
+            )
+            phrases.append(obj)
+            if (
+                isinstance(phrase, StrPhrase)
+                and phrase.is_synset_linked
+                and phrase.lexeme is None
+            ):
+                links.append((obj, entry.links[phrase.phrase_str], entry))
+                return obj
+            for i, child in enumerate(phrase.children):
+                compositions.append(
+                    PhraseComposition(
+                        parent=obj,
+                        child=add(child, entry),
+                        index=i,
+                        is_primary=child.is_primary,
+                    )
+                )
+            return obj
+
+        roots = [add(entry.phrase, entry) for entry in entries]
+        root_of = {id(entry): root for entry, root in zip(entries, roots)}
+
+        # one query for existing definitions and linked synsets' phrases
+        keys = set(defined) | {synset.key for _, synset, _ in links}
+        existing = {
+            (pos, wn_offset): (phrase_id, source_file)
+            for pos, wn_offset, phrase_id, source_file in (
+                SynsetDef.objects.filter(
+                    wn_offset__in={wn_offset for _, wn_offset in keys}
+                ).values_list("pos", "wn_offset", "phrase", "source_file")
+            )
+            if (pos, wn_offset) in keys
+        }
+        for key, (synset, entry) in defined.items():
+            if key in existing:
+                raise IntegrityError(
+                    f"{synset} at {entry.path} "
+                    f"already defined at {existing[key][1]}"
+                )
+        for obj, synset, entry in links:
+            target: Union[Phrase, int, None] = None
+            if synset.key in defined:
+                target = root_of[id(defined[synset.key][1])]
+            elif synset.key in existing:
+                target = existing[synset.key][0]
+            if target is None:
+                error = SynsetDef.DoesNotExist(
+                    f"undefined synset '{synset.name}'"
+                )
+                raise ValueError(f"at '{entry.path}'") from error
+            composition = PhraseComposition(parent=obj, index=0)
+            if isinstance(target, Phrase):
+                composition.child = target
+            else:
+                composition.child_id = target  # type: ignore
+            compositions.append(composition)
+
+        defs = [
+            SynsetDef(
+                phrase=root_of[id(entry)],
+                pos=synset.pos,
+                wn_offset=synset.offset,
+                source_file=entry.path.suffix,
+            )
+            for synset, entry in defined.values()
+        ]
+        with transaction.atomic():
+            Phrase.objects.bulk_create(phrases, self.batch_size)
+            PhraseComposition.objects.bulk_create(
+                compositions, self.batch_size
+            )
+            SynsetDef.objects.bulk_create(defs, self.batch_size)
+        self.defined.extend(synset for synset, _ in defined.values())
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from threading import Lock
+from typing import Optional
+
+from nltk.corpus.reader import Synset
+
+from carpet.models import Phrase, SynsetDef
+from maas.versions import TableVersion
+
+SynsetKey = tuple[str, int]
+
+
+def synset_key(synset: Synset) -> SynsetKey:
+    return synset.pos(), synset.offset()
+
+
+class SynsetIndex:
+    """Process-wide, read-only map of defined synsets to their phrases,
+    keyed by `(pos, wn_offset)`.
+    Loaded from the database on first use,
+    and again once `version` changes.
+    """
+
+    def __init__(self, version: TableVersion) -> None:
+        self._phrases: Optional[dict[SynsetKey, Phrase]] = None
+        self._lock = Lock()
+        self._version = version
+        version.register(self.clear)
+        self.hits = 0
+        self.misses = 0
+        self._counts_lock = Lock()
+
+    def _load(self) -> dict[SynsetKey, Phrase]:
+        defs = list(
+            SynsetDef.objects.values_list(
+                "pos", "wn_offset", "phrase", "phrase__compiled"
+            )
+        )
+        phrases = Phrase.objects.trees(
+            {phrase_id: compiled for *_, phrase_id, compiled in defs}
+        )
+        return {
+            (pos, wn_offset): phrases[phrase_id]
+            for pos, wn_offset, phrase_id, _ in defs
+        }
+
+    def load(self) -> None:
+        """(Re)builds the index from the database."""
+        phrases = self._load()
+        with self._lock:
+            self._phrases = phrases
+
+    def clear(self) -> None:
+        with self._lock:
+            self._phrases = None
+        with self._counts_lock:
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def phrases(self) -> dict[SynsetKey, Phrase]:
+        self._version.check()
+        phrases = self._phrases
+        if phrases is None:
+            with self._lock:
+                phrases = self._phrases
+                if phrases is None:
+                    phrases = self._phrases = self._load()
+        return phrases
+
+    def __contains__(self, synset: Synset) -> bool:
+        return synset_key(synset) in self.phrases
+
+    def __len__(self) -> int:
+        return len(self.phrases)
+
+    def get_phrase(self, synset: Synset) -> Optional[Phrase]:
+        """Returns a copy of the phrase tree defining `synset`,
+        as phrases are modified while translating.
+        """
+        phrase = self.phrases.get(synset_key(synset))
+        if phrase is None:
+            with self._counts_lock:
+                self.misses += 1
+            return None
+        with self._counts_lock:
+            self.hits += 1
+        return phrase.copy_tree()
+
+
+dictionary_version = TableVersion(Phrase, SynsetDef)
+synset_index = SynsetIndex(dictionary_version)
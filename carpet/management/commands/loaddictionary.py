@@ -4,7 +4,9 @@ from django.conf import settings
 from django.core.management.base import BaseCommand, CommandParser
 from jangle.models import LanguageTag
 
+from carpet.closure import refresh_closures
 from carpet.dictionary import DictionaryLoader
+from carpet.index import dictionary_version
 from carpet.models import Phrase
 
 
@@ -23,6 +25,18 @@ class Command(BaseCommand):
             default=str(settings.BASE_DIR / "carpet" / "dictionary"),
             help="Path to dictionary directory or file",
         )
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            help="Parses all files first, then saves them in one transaction",
+        )
+        parser.add_argument(
+            "-j",
+            "--workers",
+            type=int,
+            default=0,
+            help="Parses files in this many processes, implies --bulk",
+        )
         parser.add_argument(
             "--lang",
             default="x-maas-native",
@@ -33,4 +47,12 @@ class Command(BaseCommand):
         if options["clear"]:
             Phrase.objects.all().delete()  # phrases cascade
         lang = LanguageTag.objects.get_from_str(options["lang"])
-        DictionaryLoader(lang).register(Path(options["path"]).resolve())
+        bulk = options["bulk"] or options["workers"] > 0
+        loader = DictionaryLoader(lang, bulk=bulk, workers=options["workers"])
+        loader.register(Path(options["path"]).resolve())
+        if bulk:
+            loader.write()
+        Phrase.objects.compile_trees()
+        # servers rebuild their synset index once they see the new version
+        dictionary_version.invalidate()
+        refresh_closures(loader.defined_synsets)
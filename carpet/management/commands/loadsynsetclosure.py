@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandParser
+
+from carpet.closure import save_closures
+from carpet.index import synset_key
+from carpet.models import SynsetClosure
+from carpet.wordnet import wordnet
+
+
+class Command(BaseCommand):
+    help = (
+        "Precomputes the nearest synset definition of every WordNet synset "
+        "missing one in database"
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "-c",
+            "--clear",
+            action="store_true",
+            help="Deletes existing data",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=512,
+            help="Number of closures saved per query",
+        )
+
+    def handle(self, *args, **options) -> None:
+        if options["clear"]:
+            SynsetClosure.objects.all().delete()
+        existing = set(SynsetClosure.objects.values_list("pos", "wn_offset"))
+        save_closures(
+            (
+                synset
+                for synset in wordnet.all_synsets()
+                if synset_key(synset) not in existing
+            ),
+            options["batch_size"],
+        )
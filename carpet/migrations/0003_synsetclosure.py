@@ -0,0 +1,67 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("carpet", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SynsetClosure",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "pos",
+                    models.CharField(
+                        choices=[
+                            ("a", "adjective"),
+                            ("s", "satellite adjective"),
+                            ("r", "adverb"),
+                            ("n", "noun"),
+                            ("v", "verb"),
+                        ],
+                        max_length=1,
+                        verbose_name="part of speech",
+                    ),
+                ),
+                (
+                    "wn_offset",
+                    models.PositiveBigIntegerField(verbose_name="offset"),
+                ),
+                (
+                    "hypernym_distance",
+                    models.PositiveSmallIntegerField(default=0),
+                ),
+                (
+                    "hyponym_distance",
+                    models.PositiveSmallIntegerField(default=0),
+                ),
+                ("pointers", models.CharField(default="", max_length=32)),
+                ("path", models.JSONField(default=list)),
+                (
+                    "synset_def",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="closures",
+                        to="carpet.synsetdef",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "synset closure",
+                "unique_together": {("pos", "wn_offset")},
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("carpet", "0003_synsetclosure"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="phrase",
+            name="compiled",
+            field=models.JSONField(editable=False, null=True),
+        ),
+    ]
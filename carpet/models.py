@@ -1,9 +1,12 @@
 from __future__ import annotations
 
+from copy import copy
 from functools import cached_property
-from typing import Generator
+from itertools import islice
+from typing import Any, Generator, Iterable, Optional
 
-from django.db import models
+from django.db import connections, models
+from django.db.models import Q
 from jangle.utils import BatchedCreateManager
 from nltk.corpus.reader import Synset
 
@@ -11,6 +14,182 @@ from carpet.base import AbstractPhrase, PitchChange, Suffix
 from carpet.wordnet import wordnet
 from maas.models import Lexeme
 
+SUBTREES_SQL = """
+WITH RECURSIVE tree(id) AS (
+    SELECT id FROM carpet_phrase WHERE id IN ({roots})
+    UNION
+    SELECT rel.child_id FROM carpet_phrasecomposition rel
+    JOIN tree ON rel.parent_id = tree.id
+)
+SELECT phrase.id, phrase.pitch_change, phrase.multiplier, phrase.count,
+    phrase.suffix, phrase.lexeme_id, lexeme.comment,
+    rel.parent_id, rel."index", rel.is_primary
+FROM tree
+JOIN carpet_phrase phrase ON phrase.id = tree.id
+LEFT JOIN maas_lexeme lexeme ON lexeme.id = phrase.lexeme_id
+LEFT JOIN carpet_phrasecomposition rel ON rel.child_id = phrase.id
+    AND rel.parent_id IN (SELECT id FROM tree)
+"""
+"""Phrases under the roots, with their lexemes,
+and their compositions within the subtrees.
+"""
+
+CompiledPhrase = list[Any]
+"""`[lexeme_id, pitch_change, multiplier, count, suffix, is_primary,
+[*children]]`, see `compile_phrase`.
+"""
+
+
+def compile_phrase(phrase: AbstractPhrase) -> CompiledPhrase:
+    """Compact, JSON-serializable form of a whole phrase tree."""
+    return [
+        None if phrase.lexeme is None else phrase.lexeme.pk,
+        phrase.pitch_change,
+        phrase.multiplier,
+        phrase.count,
+        phrase.suffix,
+        phrase.is_primary,
+        [compile_phrase(child) for child in phrase.children],
+    ]
+
+
+class PhraseManager(models.Manager["Phrase"]):
+    def subtree(self, pk: int) -> Phrase:
+        """Loads a phrase with all its descendants and their lexemes
+        in a single query, see `subtrees`.
+        """
+        try:
+            return self.subtrees([pk])[pk]
+        except KeyError as e:
+            raise self.model.DoesNotExist(f"phrase {pk}") from e
+
+    def subtrees(
+        self, pks: Iterable[int], batch_size=512
+    ) -> dict[int, Phrase]:
+        """Loads phrases with all their descendants and their lexemes
+        in a single query per `batch_size` phrases, by id.
+        Children are set up front, so walking the trees doesn't query.
+        Phrases used more than once, such as synset-linked ones,
+        are loaded into separate objects for each use.
+        """
+        it = iter(dict.fromkeys(pks))
+        trees: dict[int, Phrase] = {}
+        while batch := list(islice(it, batch_size)):
+            trees.update(self._subtrees(batch))
+        return trees
+
+    def _subtrees(self, pks: list[int]) -> dict[int, Phrase]:
+        sql = SUBTREES_SQL.format(roots=", ".join(["%s"] * len(pks)))
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, pks)
+            rows = cursor.fetchall()
+
+        values: dict[int, tuple] = {}
+        lexemes: dict[int, Lexeme] = {}
+        rels: dict[int, list[tuple[int, int, bool]]] = {}
+        for row in rows:
+            pk, lexeme_id, comment = row[0], row[5], row[6]
+            parent_id, index, is_primary = row[7:]
+            values[pk] = row[:6]
+            if lexeme_id is not None and lexeme_id not in lexemes:
+                lexemes[lexeme_id] = Lexeme.from_db(
+                    self.db, ["id", "comment"], [lexeme_id, comment]
+                )
+            if parent_id is not None:
+                rels.setdefault(parent_id, []).append(
+                    (index, pk, bool(is_primary))
+                )
+        for children in rels.values():
+            children.sort()
+        field_names = [
+            "id",
+            "pitch_change",
+            "multiplier",
+            "count",
+            "suffix",
+            "lexeme_id",
+        ]
+
+        def build(pk: int, ancestors: frozenset[int]) -> Phrase:
+            if pk in ancestors:
+                raise ValueError(f"phrase {pk} contains itself")
+            phrase = self.model.from_db(self.db, field_names, values[pk])
+            if phrase.lexeme_id is not None:  # type: ignore
+                phrase.lexeme = lexemes[phrase.lexeme_id]  # type: ignore
+            ancestors |= {pk}
+            children = []
+            for _, child_pk, is_primary in rels.get(pk, []):
+                child = build(child_pk, ancestors)
+                child.is_primary = is_primary
+                children.append(child)
+            phrase.__dict__["children"] = children
+            return phrase
+
+        return {pk: build(pk, frozenset()) for pk in pks if pk in values}
+
+    def from_compiled(
+        self, compiled: CompiledPhrase, pk: Optional[int] = None
+    ) -> Phrase:
+        """Builds the in-memory tree of a compiled phrase,
+        without querying the database.
+        Descendants aren't saved, only the root has a `pk`.
+        """
+        lexemes: dict[int, Lexeme] = {}
+
+        def build(compiled: CompiledPhrase) -> Phrase:
+            lexeme_id, pitch_change, multiplier, count, suffix = compiled[:5]
+            phrase = self.model(
+                pitch_change=pitch_change,
+                multiplier=multiplier,
+                count=count,
+                suffix=suffix,
+            )
+            if lexeme_id is not None:
+                if lexeme_id not in lexemes:
+                    lexemes[lexeme_id] = Lexeme.from_db(
+                        self.db, ["id"], [lexeme_id]
+                    )
+                phrase.lexeme = lexemes[lexeme_id]
+            phrase.is_primary = compiled[5]
+            phrase.__dict__["children"] = [
+                build(child) for child in compiled[6]
+            ]
+            return phrase
+
+        phrase = build(compiled)
+        phrase.pk = pk
+        phrase.compiled = compiled
+        phrase._state.adding = pk is None
+        phrase._state.db = self.db
+        return phrase
+
+    def trees(
+        self, compiled: dict[int, Optional[CompiledPhrase]]
+    ) -> dict[int, Phrase]:
+        """Builds phrases from their compiled forms by id,
+        loading the subtrees of any that aren't compiled.
+        """
+        trees = self.subtrees(
+            pk for pk, value in compiled.items() if value is None
+        )
+        for pk, value in compiled.items():
+            if value is not None:
+                trees[pk] = self.from_compiled(value, pk)
+        return trees
+
+    def compile_trees(self, batch_size=512) -> int:
+        """Writes the compiled forms of phrases defining synsets
+        which don't have one yet, returning how many were compiled.
+        """
+        pks = self.filter(
+            defined_synsets__isnull=False, compiled__isnull=True
+        ).values_list("pk", flat=True)
+        trees = self.subtrees(set(pks), batch_size)
+        for tree in trees.values():
+            tree.compiled = compile_phrase(tree)
+        self.bulk_update(trees.values(), ["compiled"], batch_size)
+        return len(trees)
+
 
 class Phrase(models.Model, AbstractPhrase):
     child_rels: "models.manager.RelatedManager[PhraseComposition]"
@@ -31,15 +210,41 @@ class Phrase(models.Model, AbstractPhrase):
         null=True,
         on_delete=models.CASCADE,
     )  # type: ignore
+    compiled = models.JSONField(null=True, editable=False)
+    """Whole tree of a phrase defining synsets,
+    written by `PhraseManager.compile_trees`, see `compile_phrase`.
+    """
 
     def _get_children(self) -> Generator[Phrase, None, None]:
         for child_rel in self.child_rels.order_by("index"):
             child_rel.child.is_primary = child_rel.is_primary
             yield child_rel.child
 
+    def tree(self) -> Phrase:
+        """Phrase with its whole tree loaded,
+        from its compiled form if it has one.
+        """
+        if self.compiled is not None:
+            return Phrase.objects.from_compiled(self.compiled, self.pk)
+        return Phrase.objects.subtree(self.pk)
+
+    def copy_tree(self) -> Phrase:
+        """Copies a phrase and its loaded descendants,
+        as phrases are modified while translating.
+        Lexemes are shared.
+        """
+        phrase = copy(self)
+        if "children" in self.__dict__:
+            phrase.__dict__["children"] = [
+                child.copy_tree() for child in self.children  # type: ignore
+            ]
+        return phrase
+
     def __str__(self) -> str:
         return AbstractPhrase.__str__(self)
 
+    objects = PhraseManager()
+
 
 class PhraseComposition(models.Model):
     parent = models.ForeignKey(
@@ -67,6 +272,14 @@ class PhraseComposition(models.Model):
         ordering = ["parent", "index"]
 
 
+def synsets_query(synsets: Iterable[Synset]) -> Q:
+    """Matches rows with a `pos` and `wn_offset` of any of the synsets."""
+    query = Q(pk__in=[])
+    for synset in synsets:
+        query |= Q(pos=synset.pos(), wn_offset=synset.offset())
+    return query
+
+
 class SynsetDefQuerySet(models.QuerySet["SynsetDef"]):
     def from_synset(self, synset: Synset) -> SynsetDefQuerySet:
         return self.filter(pos=synset.pos(), wn_offset=synset.offset())
@@ -74,6 +287,9 @@ class SynsetDefQuerySet(models.QuerySet["SynsetDef"]):
     def get_from_synset(self, synset: Synset) -> SynsetDef:
         return self.get(pos=synset.pos(), wn_offset=synset.offset())
 
+    def from_synsets(self, synsets: Iterable[Synset]) -> SynsetDefQuerySet:
+        return self.filter(synsets_query(synsets))
+
 
 class SynsetDefManager(BatchedCreateManager["SynsetDef"]):
     def get_queryset(self) -> SynsetDefQuerySet:
@@ -85,6 +301,9 @@ class SynsetDefManager(BatchedCreateManager["SynsetDef"]):
     def get_from_synset(self, synset: Synset) -> SynsetDef:
         return self.get_queryset().get_from_synset(synset)
 
+    def from_synsets(self, synsets: Iterable[Synset]) -> SynsetDefQuerySet:
+        return self.get_queryset().from_synsets(synsets)
+
 
 class SynsetDef(models.Model):
     """Links a WordNet synset to a Carpet phrase."""
@@ -122,3 +341,48 @@ class SynsetDef(models.Model):
     class Meta:
         verbose_name = "synset definition"
         unique_together = ("pos", "wn_offset")
+
+
+class SynsetClosureQuerySet(models.QuerySet["SynsetClosure"]):
+    def from_synsets(self, synsets: Iterable[Synset]) -> SynsetClosureQuerySet:
+        return self.filter(synsets_query(synsets))
+
+
+class SynsetClosureManager(BatchedCreateManager["SynsetClosure"]):
+    def get_queryset(self) -> SynsetClosureQuerySet:
+        return SynsetClosureQuerySet(self.model, using=self._db)
+
+    def from_synsets(self, synsets: Iterable[Synset]) -> SynsetClosureQuerySet:
+        return self.get_queryset().from_synsets(synsets)
+
+
+class SynsetClosure(models.Model):
+    """Links a WordNet synset to its nearest synset definition,
+    in the order the translator searches hypernyms & hyponyms.
+    A null definition means none are within `SYNSET_CLOSURE_DEPTHS`.
+    """
+
+    pos = models.CharField(
+        "part of speech",
+        choices=SynsetDef.WordnetPOS.choices,
+        max_length=1,
+    )
+    wn_offset = models.PositiveBigIntegerField("offset")
+    synset_def = models.ForeignKey(
+        SynsetDef,
+        null=True,
+        related_name="closures",
+        on_delete=models.CASCADE,
+    )
+    hypernym_distance = models.PositiveSmallIntegerField(default=0)
+    hyponym_distance = models.PositiveSmallIntegerField(default=0)
+    pointers = models.CharField(max_length=32, default="")
+    """WordNet pointer symbols leading to the definition."""
+    path = models.JSONField(default=list)
+    """Names of the synsets leading to the definition, inclusive."""
+
+    objects = SynsetClosureManager()
+
+    class Meta:
+        verbose_name = "synset closure"
+        unique_together = ("pos", "wn_offset")
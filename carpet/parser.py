@@ -1,5 +1,9 @@
-from typing import Any, Generator, Optional
+from __future__ import annotations
 
+from functools import lru_cache
+from typing import Generator, NamedTuple, Optional
+
+from django.conf import settings
 from jangle.models import LanguageTag
 
 from carpet.base import (
@@ -16,7 +20,249 @@ from carpet.base import (
 )
 from carpet.models import Phrase, PhraseComposition, SynsetDef
 from carpet.wordnet import wordnet
-from maas.models import LexemeTranslation, NativeLang
+from maas.models import (
+    Lexeme,
+    LexemeTranslation,
+    NativeLang,
+    lexeme_index,
+    lexicon_version,
+)
+
+WORD = "word"
+SPACE = " "
+PREFIX_CHARS = frozenset(PitchChange.values) | {SYNSET_CHAR}
+BREAK_CHARS = frozenset(
+    [OPEN_CHAR, CLOSE_CHAR, PRIMARY_OPEN_CHAR, PRIMARY_CLOSE_CHAR]
+    + [MULTIPLIER_CHAR, COUNT_CHAR]
+    + Suffix.values
+)
+"""Characters which end a word."""
+
+
+class Token(NamedTuple):
+    kind: str
+    """`WORD`, `SPACE` or the special character."""
+    text: str
+    """Word, or digits following a multiplier or count character."""
+    pos: int
+
+
+def tokenize(phrase: str) -> Generator[Token, None, None]:
+    """Splits a phrase string in a single pass.
+    Pitch changes and synset links are only special before words,
+    so synset names such as `t-shirt.n.01` are single words.
+    """
+    i = 0
+    while i < len(phrase):
+        char = phrase[i]
+        start = i
+        i += 1
+        if char.isspace():
+            while i < len(phrase) and phrase[i].isspace():
+                i += 1
+            yield Token(SPACE, "", start)
+        elif char in (MULTIPLIER_CHAR, COUNT_CHAR):
+            while i < len(phrase) and phrase[i].isdigit():
+                i += 1
+            yield Token(char, phrase[start + 1 : i], start)
+        elif char in BREAK_CHARS or char in PREFIX_CHARS:
+            yield Token(char, "", start)
+        else:
+            while i < len(phrase) and not (
+                phrase[i].isspace() or phrase[i] in BREAK_CHARS
+            ):
+                i += 1
+            yield Token(WORD, phrase[start:i], start)
+
+
+def find_lexeme(word: str, lang: LanguageTag) -> Lexeme:
+    """Looks up the in-memory `lexeme_index` first,
+    querying only for words missing from it.
+    """
+    lexeme = lexeme_index.get(word, lang)
+    if lexeme is not None:
+        return lexeme
+    try:
+        translation = LexemeTranslation.objects.select_related("lexeme").get(
+            word=word, lang=lang
+        )
+    except LexemeTranslation.DoesNotExist as e:
+        raise LexemeTranslation.DoesNotExist(f"lexeme '{word}'") from e
+    return translation.lexeme
+
+
+class PhraseNode(NamedTuple):
+    """Parsed, immutable form of a `StrPhrase`, see `parse_phrase`."""
+
+    text: str = ""
+    """Synset name of synset-linked phrases, without a lexeme."""
+    lexeme: Optional[Lexeme] = None
+    children: tuple[PhraseNode, ...] = ()
+    is_primary: bool = False
+    pitch_change: Optional[str] = None
+    multiplier: int = 1
+    count: Optional[int] = None
+    suffix: Optional[str] = None
+    is_synset_linked: bool = False
+
+
+class PhraseParser:
+    """Recursive-descent parser building a whole phrase tree at once.
+    Errors are reported at positions in the whole phrase string.
+    """
+
+    def __init__(self, phrase: str, lang: LanguageTag) -> None:
+        self.phrase = phrase
+        self.lang = lang
+        self.tokens = list(tokenize(phrase))
+        self.i = 0
+
+    def error(self, message: str, token: Token) -> ValueError:
+        return ValueError(f"{message} at '{self.phrase}'[{token.pos}]")
+
+    def peek(self) -> Optional[Token]:
+        if self.i < len(self.tokens):
+            return self.tokens[self.i]
+        return None
+
+    def parse(self) -> PhraseNode:
+        if self.phrase.isalpha():
+            return PhraseNode(lexeme=find_lexeme(self.phrase, self.lang))
+        return PhraseNode(children=self.items(None, False))
+
+    def items(
+        self, close: Optional[str], in_parens: bool
+    ) -> tuple[PhraseNode, ...]:
+        """Space-separated phrases up to the `close` character,
+        or the end of the string.
+        """
+        items = []
+        while (token := self.peek()) is not None:
+            if token.kind == SPACE:
+                self.i += 1
+            elif token.kind == close:
+                return tuple(items)
+            elif token.kind in (CLOSE_CHAR, PRIMARY_CLOSE_CHAR):
+                raise self.error(f"unopened '{token.kind}'", token)
+            else:
+                item = self.item(in_parens)
+                if item is not None:
+                    items.append(item)
+                token = self.peek()
+                if token is not None and token.kind not in (SPACE, close):
+                    if token.kind in (CLOSE_CHAR, PRIMARY_CLOSE_CHAR):
+                        raise self.error(f"unopened '{token.kind}'", token)
+                    unexpected = token.text or token.kind
+                    raise self.error(f"unexpected '{unexpected}'", token)
+        if close == CLOSE_CHAR:
+            raise ValueError(f"unclosed '{OPEN_CHAR}' in '{self.phrase}'")
+        if close == PRIMARY_CLOSE_CHAR:
+            raise ValueError(
+                f"unclosed '{PRIMARY_OPEN_CHAR}' in '{self.phrase}'"
+            )
+        return tuple(items)
+
+    def item(self, in_parens: bool) -> Optional[PhraseNode]:
+        """A word or subphrase with its prefixes and suffixes,
+        None if it's empty.
+        """
+        node = PhraseNode()
+        has_multiplier = has_count = False
+        body = None
+        while (token := self.peek()) is not None:
+            kind = token.kind
+            if kind in PitchChange.values and body is None:
+                if node.pitch_change:
+                    raise self.error("multiple tone changes", token)
+                node = node._replace(pitch_change=kind)
+            elif kind == SYNSET_CHAR and body is None:
+                if node.is_synset_linked:
+                    raise self.error(f"repeated '{SYNSET_CHAR}'", token)
+                node = node._replace(is_synset_linked=True)
+            elif kind == MULTIPLIER_CHAR:
+                if has_multiplier:
+                    raise self.error(f"repeated '{MULTIPLIER_CHAR}'", token)
+                has_multiplier = True
+                if token.text:
+                    node = node._replace(multiplier=int(token.text))
+            elif kind == COUNT_CHAR:
+                if has_count:
+                    raise self.error(f"repeated '{COUNT_CHAR}'", token)
+                has_count = True
+                if token.text:
+                    node = node._replace(count=int(token.text))
+            elif kind in Suffix.values:
+                if node.suffix:
+                    raise self.error(
+                        "multiple suffixes (use parentheses)", token
+                    )
+                node = node._replace(suffix=kind)
+            elif body is None and kind == WORD:
+                self.i += 1
+                body = self.word(token, node.is_synset_linked)
+                continue
+            elif body is None and kind == OPEN_CHAR:
+                self.i += 1
+                body = self.group(CLOSE_CHAR, True)
+                continue
+            elif body is None and kind == PRIMARY_OPEN_CHAR:
+                if in_parens:
+                    raise self.error("nested primary subphrase", token)
+                self.i += 1
+                body = self.group(PRIMARY_CLOSE_CHAR, False)
+                node = node._replace(is_primary=True)
+                continue
+            else:
+                break
+            self.i += 1
+        if body is None:
+            return None
+        text, lexeme, children = body
+        return node._replace(text=text, lexeme=lexeme, children=children)
+
+    def word(
+        self, token: Token, is_synset_linked: bool
+    ) -> tuple[str, Optional[Lexeme], tuple[PhraseNode, ...]]:
+        if token.text.isalpha():
+            return "", find_lexeme(token.text, self.lang), ()
+        if not is_synset_linked:
+            raise self.error(f"invalid word '{token.text}'", token)
+        return token.text, None, ()
+
+    def group(
+        self, close: str, in_parens: bool
+    ) -> Optional[tuple[str, Optional[Lexeme], tuple[PhraseNode, ...]]]:
+        """Subphrase up to `close`, None if it's empty.
+        A single word is the subphrase's lexeme.
+        """
+        start = self.i
+        children = self.items(close, in_parens)
+        self.i += 1
+        if not children:
+            return None
+        lexeme = children[0].lexeme
+        if (
+            lexeme is not None
+            and children == (PhraseNode(lexeme=lexeme),)
+            and not any(
+                token.kind in (OPEN_CHAR, PRIMARY_OPEN_CHAR)
+                for token in self.tokens[start : self.i]
+            )
+        ):
+            return "", lexeme, ()
+        return "", None, children
+
+
+@lru_cache(maxsize=settings.PHRASE_PARSE_CACHE_SIZE)
+def parse_phrase(phrase: str, lang: LanguageTag) -> PhraseNode:
+    """Parses a stripped phrase string, resolving its words to lexemes.
+    Memoized, as the same phrases are parsed over and over,
+    and cleared with the lexicon's other caches.
+    """
+    return PhraseParser(phrase, lang).parse()
+
+
+lexicon_version.register(parse_phrase.cache_clear)
 
 
 class StrPhrase(AbstractPhrase):
@@ -24,24 +270,31 @@ class StrPhrase(AbstractPhrase):
     phrase_str: str = ""
     is_synset_linked = False
 
-    def _check_lexeme(self):
-        if self.phrase_str.isalpha():
-            try:
-                self.lexeme = LexemeTranslation.objects.get(
-                    word=self.phrase_str,
-                    lang=self.lang,
-                ).lexeme
-                self.phrase_str = ""
-            except LexemeTranslation.DoesNotExist as e:
-                raise LexemeTranslation.DoesNotExist(
-                    f"lexeme '{self.phrase_str}'"
-                ) from e
-
     def __init__(self, phrase: str, lang=NativeLang()) -> None:
         self.lang = lang
-        self.phrase_str = phrase.strip()
-        if self.phrase_str:
-            self._check_lexeme()
+        lexicon_version.check()
+        self._set_node(parse_phrase(phrase.strip(), lang))
+
+    @classmethod
+    def from_node(cls, node: PhraseNode, lang: LanguageTag) -> StrPhrase:
+        phrase = cls.__new__(cls)
+        phrase.lang = lang
+        phrase._set_node(node)
+        return phrase
+
+    def _set_node(self, node: PhraseNode) -> None:
+        """Sets up a phrase from its parsed form,
+        which is shared and so not modified.
+        """
+        self._node = node
+        self.phrase_str = node.text
+        self.lexeme = node.lexeme
+        self.is_primary = node.is_primary
+        self.pitch_change = node.pitch_change
+        self.multiplier = node.multiplier
+        self.count = node.count
+        self.suffix = node.suffix
+        self.is_synset_linked = node.is_synset_linked
 
     def _get_children(self) -> Generator[AbstractPhrase, None, None]:
         if self.lexeme is not None:
@@ -49,100 +302,17 @@ class StrPhrase(AbstractPhrase):
         if self.is_synset_linked:
             try:
                 synset = wordnet.synset(self.phrase_str)
-                yield SynsetDef.objects.get_from_synset(synset).phrase # type: ignore
+                def_ = SynsetDef.objects.select_related(
+                    "phrase"
+                ).get_from_synset(synset)
+                yield def_.phrase.tree()
             except SynsetDef.DoesNotExist as e:
                 raise SynsetDef.DoesNotExist(
                     f"undefined synset '{self.phrase_str}'"
                 ) from e
             return
-        child = StrPhrase("", self.lang)
-        depth = 0
-        primary_depth = 0
-        is_multiplier = False
-        multiplier_str = ""
-        is_count = False
-        count_str = ""
-        error_str = None
-
-        for i, char in enumerate(self.phrase_str + " "):
-            if char == OPEN_CHAR:
-                if depth:
-                    child.phrase_str += char
-                depth += 1
-            elif char == CLOSE_CHAR:
-                depth -= 1
-                if depth:
-                    child.phrase_str += char
-                elif depth < 0:
-                    error_str = f"unopened '{CLOSE_CHAR}'"
-            elif char == PRIMARY_OPEN_CHAR:
-                if primary_depth:
-                    child.phrase_str += char
-                else:
-                    child.is_primary = True
-                primary_depth += 1
-                if depth:
-                    error_str = "nested primary subphrase"
-            elif char == PRIMARY_CLOSE_CHAR:
-                primary_depth -= 1
-                if primary_depth:
-                    child.phrase_str += char
-                elif primary_depth < 0:
-                    error_str = "unopened '{PRIMARY_CLOSE_CHAR}'"
-            elif primary_depth or primary_depth:
-                child.phrase_str += char
-            elif not child.phrase_str and char in PitchChange.values:
-                if child.pitch_change:
-                    error_str = "multiple tone changes"
-                child.pitch_change = char
-            elif not child.phrase_str and char == SYNSET_CHAR:
-                if child.is_synset_linked:
-                    error_str = f"repeated '{SYNSET_CHAR}'"
-                child.is_synset_linked = True
-            elif char == MULTIPLIER_CHAR:
-                if is_multiplier:
-                    error_str = f"repeated '{MULTIPLIER_CHAR}'"
-                is_multiplier = True
-            elif is_multiplier and char.isdigit():
-                multiplier_str += char
-            elif char == COUNT_CHAR:
-                if is_count:
-                    error_str = f"repeated '{COUNT_CHAR}'"
-                is_count = True
-            elif is_count and char.isdigit():
-                count_str += char
-            elif char in Suffix.values:
-                if child.suffix:
-                    error_str = "multiple suffixes (use parentheses)"
-                child.suffix = char
-            elif char.isspace():
-                child.phrase_str = child.phrase_str.strip()
-                if child.phrase_str:
-                    if multiplier_str:
-                        child.multiplier *= int(multiplier_str)
-                    if count_str:
-                        if child.count is None:
-                            child.count = 1
-                        child.count *= int(count_str)
-                    child._check_lexeme()
-                    yield child
-                child = StrPhrase("", self.lang)
-                depth = 0
-                primary_depth = 0
-                is_multiplier = False
-                multiplier_str = ""
-                is_count = False
-                count_str = ""
-            else:
-                child.phrase_str += char
-            if error_str:
-                raise ValueError(f"{error_str} at '{self.phrase_str}'[{i}]")
-        if depth:
-            raise ValueError(f"unclosed '{OPEN_CHAR}' in '{self.phrase_str}'")
-        if primary_depth:
-            raise ValueError(
-                f"unclosed '{PRIMARY_CLOSE_CHAR}' in '{self.phrase_str}'"
-            )
+        for child in self._node.children:
+            yield StrPhrase.from_node(child, self.lang)
 
     def save(self) -> Phrase:
         obj = Phrase.objects.create(
@@ -1,9 +1,8 @@
-from music21.note import Note
-from music21.spanner import Slur
 from music21.stream.base import Score, Stream
 
 from carpet.base import AbstractPhrase, PitchChange, Suffix
 from carpet.parser import StrPhrase
+from maas.events import EventStream
 from maas.speech import MaasContext, MaasSpeech, SizeMode
 from maas.models import NativeLang, Lexeme
 
@@ -16,41 +15,40 @@ COUNT, NOT, WHAT = [
 
 
 class CarpetSpeech(MaasSpeech):
-    def phrase_to_stream(self, phrase: AbstractPhrase) -> Stream:
-        stream = Score()
+    def phrase_to_events(self, phrase: AbstractPhrase) -> EventStream:
         if phrase.pitch_change:
             if phrase.pitch_change == PitchChange.UP:
                 self.phrase_up()
             elif phrase.pitch_change == PitchChange.DOWN:
                 self.phrase_down()
-        core_stream = Score()
+        core_events = EventStream()
 
         children = list(phrase.modified_children())
         if phrase.lexeme:
-            core_stream.append(phrase.lexeme.stream(self))
+            core_events.extend(phrase.lexeme.events(self))
         for child in children:
-            core_stream.append(self.phrase_to_stream(child))
-        stream.repeatAppend(core_stream, phrase.multiplier)
+            core_events.extend(self.phrase_to_events(child))
+        events = core_events.repeat(phrase.multiplier)
 
         if phrase.count:
-            count_stream = COUNT.stream(self, True)
-            last_note = stream.recurse().notes.last() or count_stream.notes[-1]
-            counting_note = Note()
-            counting_note.pitches = last_note.pitches
-            (
-                counting_note.duration,
-                counting_note.articulations,
-            ) = self.ctx.sizes[SizeMode.MEDIUM]
-            count_stream.repeatAppend(counting_note, phrase.count)
-            stream.append(count_stream)
+            count_events = COUNT.events(self, True)
+            last_note = events.last_note() or count_events.last_note()
+            if last_note is not None:
+                counting_note = last_note._replace(
+                    size_mode=SizeMode.MEDIUM, lyric=None
+                )
+                count_events.events.extend([counting_note] * phrase.count)
+            events.extend(count_events)
         if phrase.count == 0 or phrase.suffix == Suffix.NOT:
-            stream.append(NOT.stream(self, True))
+            events.extend(NOT.events(self, True))
         if phrase.suffix == Suffix.WHAT:
-            stream.append(WHAT.stream(self, True))
-        stream = stream.flatten()
+            events.extend(WHAT.events(self, True))
         if self.ctx.write_slurs:
-            stream.insert(0, Slur(stream.elements))
-        return stream
+            events.slur()
+        return events
+
+    def phrase_to_stream(self, phrase: AbstractPhrase) -> Stream:
+        return self.ctx.build_stream(self.phrase_to_events(phrase))
 
 
 def str_to_score(
@@ -1,3 +1,277 @@
-from django.test import TestCase
+import warnings
+from itertools import combinations, product
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Any
 
-# Create your tests here.
+from django.db.utils import IntegrityError
+from django.test import TestCase, TransactionTestCase
+from jangle.models import LanguageTag
+
+from carpet.closure import closest_defined, nearest_defined, save_closures
+from carpet.dictionary import DictionaryLoader
+from carpet.index import synset_key
+from carpet.models import Phrase, SynsetDef
+from carpet.parser import PhraseNode, parse_phrase
+from carpet.wordnet import related_synset_levels, wordnet
+from maas.models import Lexeme, LexemeTranslation, lexicon_version
+
+
+def create_lexemes(lang: LanguageTag, words: tuple[str, ...]):
+    lexemes = {}
+    for word in words:
+        lexeme = lexemes[word] = Lexeme.objects.create()
+        LexemeTranslation.objects.create(lexeme=lexeme, word=word, lang=lang)
+    return lexemes
+
+
+class PhraseParserTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.lang, _ = LanguageTag.objects.get_or_create_from_str("x-test")
+        cls.lexemes = create_lexemes(cls.lang, ("a", "b"))
+
+    def setUp(self):
+        lexicon_version.invalidate()
+
+    def parse(self, phrase: str) -> PhraseNode:
+        return parse_phrase(phrase, self.lang)
+
+    def test_single_word(self):
+        self.assertEqual(self.parse("a"), PhraseNode(lexeme=self.lexemes["a"]))
+
+    def test_prefixes_and_suffixes(self):
+        (node,) = self.parse("+a*2#3?").children
+        self.assertEqual(
+            node,
+            PhraseNode(
+                lexeme=self.lexemes["a"],
+                pitch_change="+",
+                multiplier=2,
+                count=3,
+                suffix="?",
+            ),
+        )
+
+    def test_primary_subphrase(self):
+        primary, other = self.parse("[a b] b").children
+        self.assertTrue(primary.is_primary)
+        self.assertEqual(
+            [child.lexeme for child in primary.children],
+            [self.lexemes["a"], self.lexemes["b"]],
+        )
+        self.assertEqual(other, PhraseNode(lexeme=self.lexemes["b"]))
+
+    def test_single_word_subphrase(self):
+        (node,) = self.parse("(a)*2").children
+        self.assertEqual(
+            node, PhraseNode(lexeme=self.lexemes["a"], multiplier=2)
+        )
+
+    def test_synset_link_count(self):
+        for phrase in ("#3@x.n.01", "@x.n.01#3"):
+            with self.subTest(phrase):
+                (node,) = self.parse(phrase).children
+                self.assertEqual(
+                    node,
+                    PhraseNode(text="x.n.01", count=3, is_synset_linked=True),
+                )
+
+    def test_empty_subphrase(self):
+        self.assertEqual(self.parse("[*2 ]"), PhraseNode())
+
+    def test_malformed(self):
+        for phrase, message in (
+            ("a?b", "unexpected 'b' at 'a?b'[2]"),
+            ("(", "unclosed '(' in '('"),
+            ("[a b", "unclosed '[' in '[a b'"),
+            ("a)", "unopened ')' at 'a)'[1]"),
+            ("(a [b])", "nested primary subphrase at '(a [b])'[3]"),
+            ("a?!", "multiple suffixes (use parentheses) at 'a?!'[2]"),
+            ("a1", "invalid word 'a1' at 'a1'[0]"),
+        ):
+            with self.subTest(phrase):
+                with self.assertRaisesMessage(ValueError, message):
+                    self.parse(phrase)
+
+    def test_missing_lexeme(self):
+        with self.assertRaises(LexemeTranslation.DoesNotExist):
+            self.parse("a c")
+
+
+class ClosureTests(TestCase):
+    defined = ("canine.n.02", "puppy.n.01", "feline.n.01", "organism.n.01")
+    searched = (
+        "dog.n.01",
+        "cat.n.01",
+        "wolf.n.01",
+        "animal.n.01",
+        "domestic_animal.n.01",
+    )
+    depths = ((6, 2), (2, 0), (0, 1), (1, 1), (0, 0))
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.defs = {}
+        for name in cls.defined:
+            synset = wordnet.synset(name)
+            cls.defs[synset_key(synset)] = SynsetDef.objects.create(
+                phrase=Phrase.objects.create(),
+                pos=synset.pos(),
+                wn_offset=synset.offset(),
+            )
+        save_closures(map(wordnet.synset, cls.searched))
+
+    def search(self, synsets, hypernym_depth, hyponym_depth):
+        """First defined synset in search order, as the translator finds it."""
+        for level in related_synset_levels(
+            [(synset,) for synset in synsets], hypernym_depth, hyponym_depth
+        ):
+            for path in level:
+                if synset_key(path[0]) in self.defs:
+                    return path
+        return None
+
+    def assertSameResult(self, closest, path):
+        phrase, found = closest
+        if path is None:
+            self.assertIsNone(phrase)
+            self.assertEqual(found, ())
+        else:
+            self.assertEqual(found, path)
+            self.assertEqual(
+                phrase.pk, self.defs[synset_key(path[0])].phrase_id
+            )
+
+    def test_nearest_defined(self):
+        for name, depths in product(self.searched, self.depths):
+            with self.subTest(name, depths=depths):
+                synset = wordnet.synset(name)
+                closest = closest_defined([synset], *depths)
+                if closest is not None:
+                    self.assertSameResult(
+                        closest, nearest_defined(synset, self.defs, *depths)
+                    )
+
+    def test_search_order(self):
+        for names, depths in product(
+            combinations(self.searched, 2), self.depths
+        ):
+            with self.subTest(names, depths=depths):
+                synsets = [wordnet.synset(name) for name in names]
+                closest = closest_defined(synsets, *depths)
+                if closest is not None:
+                    self.assertSameResult(
+                        closest, self.search(synsets, *depths)
+                    )
+
+    def test_default_depths(self):
+        for name in self.searched:
+            with self.subTest(name):
+                self.assertIsNotNone(
+                    closest_defined([wordnet.synset(name)], 6, 2)
+                )
+
+    def test_missing_closure(self):
+        synsets = [wordnet.synset("dog.n.01"), wordnet.synset("house.n.01")]
+        self.assertIsNone(closest_defined(synsets, 6, 2))
+
+
+DICTIONARY = {
+    "base.yaml": """
+"a b": [dog.n.01]
+"[a] (b a)*2": [cat.n.01]
+""",
+    "more.yaml": """
+requires: [base]
+"@dog.n.01 b#3": [wolf.n.01]
+"+a? -b!": [puppy.n.01]
+""",
+    "sub/other.yml": """
+requires: [../base]
+"@cat.n.01 [a]": [feline.n.01]
+"$(a b)": [animal.n.01, organism.n.01]
+""",
+}
+
+
+class DictionaryLoaderTests(TransactionTestCase):
+    """Bulk and parallel loads against saving each phrase as it's read."""
+
+    def setUp(self):
+        self.lang, _ = LanguageTag.objects.get_or_create_from_str("x-test")
+        create_lexemes(self.lang, ("a", "b"))
+        lexicon_version.invalidate()
+        self.dir = TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.root = Path(self.dir.name)
+        self.write_files(DICTIONARY)
+
+    def write_files(self, files: dict[str, str]) -> None:
+        for name, text in files.items():
+            path = self.root / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(text)
+
+    def phrase_tuple(self, phrase: Phrase) -> tuple[Any, ...]:
+        return (
+            phrase.lexeme_id,
+            phrase.is_primary,
+            phrase.pitch_change,
+            phrase.multiplier,
+            phrase.count,
+            phrase.suffix,
+            [self.phrase_tuple(child) for child in phrase.children],
+        )
+
+    def load(self, **options) -> tuple[Any, ...]:
+        Phrase.objects.all().delete()
+        loader = DictionaryLoader(self.lang, **options)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            loader.register(self.root)
+            if loader.bulk:
+                loader.write()
+        defs = [
+            (
+                def_.pos,
+                def_.wn_offset,
+                def_.source_file,
+                self.phrase_tuple(Phrase.objects.subtree(def_.phrase_id)),
+            )
+            for def_ in SynsetDef.objects.order_by("pos", "wn_offset")
+        ]
+        return (
+            defs,
+            Phrase.objects.count(),
+            sorted(synset.name for synset in loader.defined),
+            loader.registered_paths,
+            [str(warning.message) for warning in caught],
+        )
+
+    def test_bulk(self):
+        loaded = self.load()
+        self.assertEqual(len(loaded[0]), 7)
+        self.assertEqual(self.load(bulk=True), loaded)
+
+    def test_workers(self):
+        self.assertEqual(self.load(bulk=True, workers=2), self.load())
+
+    def test_workers_need_bulk(self):
+        with self.assertRaises(ValueError):
+            DictionaryLoader(self.lang, workers=2)
+
+    def test_duplicate_definition(self):
+        self.write_files({"sub/again.yaml": '"b": [dog.n.01]'})
+        for options in ({}, {"bulk": True}, {"bulk": True, "workers": 2}):
+            with self.subTest(**options):
+                with self.assertRaises(IntegrityError):
+                    self.load(**options)
+
+    def test_undefined_link(self):
+        self.write_files({"sub/link.yaml": '"@house.n.01": [home.n.01]'})
+        for options in ({"bulk": True}, {"bulk": True, "workers": 2}):
+            with self.subTest(**options):
+                with self.assertRaisesMessage(ValueError, "link.yaml"):
+                    self.load(**options)
+                self.assertFalse(SynsetDef.objects.exists())
@@ -1,6 +1,10 @@
+from itertools import chain
+from typing import Generator, Optional
+
 from nltk.corpus import WordNetCorpusReader, LazyCorpusLoader, CorpusReader
 from django.conf import settings
 from nltk.corpus import wordnet2021
+from nltk.corpus.reader import Synset
 
 _wordnet = LazyCorpusLoader(
     settings.WORDNET_NAME,
@@ -14,3 +18,44 @@ _wordnet = LazyCorpusLoader(
 )
 
 wordnet: WordNetCorpusReader = _wordnet # type: ignore
+
+
+def related_synset_levels(
+    synsets: list[tuple[Synset]],
+    hypernym_search_depth: int,
+    hyponym_search_depth: int,
+    yielded: Optional[set[Synset]] = None,
+) -> Generator[list[tuple[Synset]], None, None]:
+    """Navigates hypernyms & hyponyms recursively,
+    yielding a whole search frontier at a time."""
+    if yielded is None:
+        yielded = set()
+    yield synsets
+    yielded.update(s[0] for s in synsets)
+
+    def related_chain(symbol: str) -> list[tuple]:
+        return list(
+            chain.from_iterable(
+                (
+                    (h, *s)
+                    for h in s[0]._related(symbol, False)
+                    if h not in yielded
+                )
+                for s in synsets
+            )
+        )
+
+    if hypernym_search_depth > 0:
+        yield from related_synset_levels(
+            related_chain("@"),
+            hypernym_search_depth - 1,
+            hyponym_search_depth,
+            yielded,
+        )
+    if hyponym_search_depth > 0:
+        yield from related_synset_levels(
+            related_chain("~"),
+            hypernym_search_depth,
+            hyponym_search_depth - 1,
+            yielded,
+        )
@@ -7,8 +7,13 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
+from django.apps import apps
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "grove.settings.production")
 
 application = get_asgi_application()
+
+if settings.SPACY_PRELOAD:
+    apps.get_app_config("translator").preload()
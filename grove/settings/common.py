@@ -1,6 +1,7 @@
 import json
 import os
 from pathlib import Path
+from typing import Optional
 
 import dj_database_url
 from music21.key import Key
@@ -129,6 +130,87 @@ REST_FRAMEWORK = {
 }
 
 WORDNET_NAME = "wordnet2021"
+# how the translator resolves related synsets to definitions:
+# "index" keeps all definitions in memory,
+# "batched" runs one query per hypernym / hyponym search level,
+# "closure" uses the loadsynsetclosure table and falls back to "index"
+SYNSET_SEARCH = os.environ.get("SYNSET_SEARCH", "index")
+# maximum hypernym & hyponym search depths covered by loadsynsetclosure
+SYNSET_CLOSURE_DEPTHS = (12, 3)
+# number of (lemma, pos, lang) WordNet lookups kept in memory
+LEMMA_SYNSETS_CACHE_SIZE = 8192
+# number of lexemes rendered at a degree, in a lyrics language etc.
+# kept in memory
+LEXEME_EVENTS_CACHE_SIZE = 4096
+# number of (phrase string, lang) Carpet phrases kept parsed in memory
+PHRASE_PARSE_CACHE_SIZE = 2048
+# seconds between checks whether another process loaded the lexicon or
+# dictionary, after which in-memory indexes and caches are rebuilt
+TABLE_VERSION_CHECK_INTERVAL = 5.0
+# load downloaded spaCy models, the lexicon's flex notes and word index
+# when the ASGI / WSGI application starts
+SPACY_PRELOAD = False
+# processes translating the sentences of a text, 0 to translate serially
+TRANSLATOR_WORKERS = int(os.environ.get("TRANSLATOR_WORKERS", 0))
+
+
+def _cache(
+    location: Optional[str], name: str, max_entries: int, timeout: int
+) -> dict:
+    """Local memory cache by default, or a file-based or Redis cache
+    at `location`, `name` separating caches sharing it.
+    """
+    options = {"MAX_ENTRIES": max_entries}
+    if not location:
+        cache = {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": name,
+            "OPTIONS": options,
+        }
+    elif location.startswith(("redis://", "rediss://")):
+        cache = {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": location,
+            "KEY_PREFIX": name,
+        }
+    else:
+        cache = {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.path.join(location, name),
+            "OPTIONS": options,
+        }
+    cache["TIMEOUT"] = timeout
+    return cache
+
+
+# translation results are cached in local memory by default,
+# or in the directory or on the Redis server at TRANSLATION_CACHE_LOCATION
+# (Redis evicts according to its own maxmemory-policy)
+TRANSLATION_CACHE_LOCATION = os.environ.get("TRANSLATION_CACHE_LOCATION")
+# seconds translation results and sentences are kept
+TRANSLATION_CACHE_TIMEOUT = int(
+    os.environ.get("TRANSLATION_CACHE_TIMEOUT", 60 * 60 * 24)
+)
+# also cache translations of each sentence in the "sentences" cache,
+# up to SENTENCE_CACHE_MAX_ENTRIES of them
+CACHE_SENTENCES = True
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "translations": _cache(
+        TRANSLATION_CACHE_LOCATION,
+        "translations",
+        int(os.environ.get("TRANSLATION_CACHE_MAX_ENTRIES", 1024)),
+        TRANSLATION_CACHE_TIMEOUT,
+    ),
+    "sentences": _cache(
+        TRANSLATION_CACHE_LOCATION,
+        "sentences",
+        int(os.environ.get("SENTENCE_CACHE_MAX_ENTRIES", 8192)),
+        TRANSLATION_CACHE_TIMEOUT,
+    ),
+}
 YAML_LOADER = SafeLoader
 DICTIONARIES = [
     {
@@ -6,4 +6,5 @@ DEBUG = False
 SECRET_KEY = os.environ["DJANGO_SECRET_KEY"]
 
 M21_OUT_DIR = os.environ["M21_OUT_DIR"]
-CORS_ALLOWED_ORIGINS = os.environ["CORS_ALLOWED_ORIGINS"].split()
\ No newline at end of file
+CORS_ALLOWED_ORIGINS = os.environ["CORS_ALLOWED_ORIGINS"].split()
+SPACY_PRELOAD = os.environ.get("SPACY_PRELOAD", "1") != "0"
@@ -7,8 +7,13 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/wsgi/
 
 import os
 
+from django.apps import apps
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "grove.settings.production")
 
 application = get_wsgi_application()
+
+if settings.SPACY_PRELOAD:
+    apps.get_app_config("translator").preload()
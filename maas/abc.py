@@ -0,0 +1,222 @@
+"""ABC notation writer for note events,
+giving the same tunes as converting their MusicXML with xml2abc,
+without writing or parsing any XML.
+Unlike xml2abc, slurs only start and stop on notes.
+"""
+
+from __future__ import annotations
+
+from fractions import Fraction
+
+from maas.events import EventStream
+from maas.layout import Layout, Piece, lay_out, syllabic
+from maas.speech import MaasContext
+
+CHARS_PER_LINE = 100
+"""Measures are added to a line while it is shorter, as in xml2abc."""
+UNIT_LENGTHS = (4, 8, 16)
+"""Denominators of the unit lengths (L:) xml2abc chooses from."""
+
+ORNAMENTS = {
+    "accent": "!>!",
+    "staccatissimo": "!wedge!",
+    "staccato": ".",
+    "strong-accent": "!^!",
+    "tenuto": "!tenuto!",
+}
+"""ABC decorations of MusicXML articulations, in xml2abc's order."""
+
+CLEFS = {"G2": "treble", "F4": "bass"}
+OCTAVE_CHANGES = {-2: "-15", -1: "-8", 1: "+8", 2: "+15"}
+
+MAJOR_KEYS = "Fb Cb Gb Db Ab Eb Bb F C G D A E B F# C# G# D# A# E# B#".split()
+"""ABC keys by number of fifths, offset by 8."""
+SHARP_ORDER = "FCGDAEB"
+ACCIDENTALS = ("__", "_", "=", "^", "^^")
+"""ABC accidentals by alteration, offset by 2."""
+
+
+def abc_duration(length: Fraction, unit: int) -> str:
+    """Duration string of a length in quarter notes,
+    for an `L:1/unit` unit length.
+    """
+    units = length * unit / 4
+    if units.numerator == 1:
+        if units.denominator == 1:
+            return ""
+        if units.denominator == 2:
+            return "/"
+        return f"/{units.denominator}"
+    if units.denominator == 1:
+        return str(units.numerator)
+    return f"{units.numerator}/{units.denominator}"
+
+
+def abc_pitch(step: str, octave: int) -> str:
+    if octave > 4:
+        step = step.lower()
+    if octave > 5:
+        step += "'" * (octave - 5)
+    if octave < 4:
+        step += "," * (4 - octave)
+    return step
+
+
+def abc_syllable(lyric: str) -> str:
+    type_, text = syllabic(lyric)
+    text = text.replace("_", r"\_").replace("-", r"\-").replace(" ", "~")
+    if text and type_ in ("begin", "middle"):
+        text += "-"
+    return text
+
+
+class ABCWriter:
+    """Writes a laid out score as an ABC tune."""
+
+    def __init__(self, ctx: MaasContext, layout: Layout, title: str) -> None:
+        self.ctx = ctx
+        self.layout = layout
+        self.title = title
+        fifths = ctx.key.sharps
+        self.key = MAJOR_KEYS[fifths + 8]
+        if fifths >= 0:
+            self.key_alters = dict.fromkeys(SHARP_ORDER[:fifths], 1)
+        else:
+            self.key_alters = dict.fromkeys(SHARP_ORDER[fifths:], -1)
+        self.unit = self.unit_length()
+        self._slur_starts: dict[int, int] = {}
+        self._slur_stops: dict[int, int] = {}
+        """Numbers of slurs starting and stopping on each event,
+        after moving them inwards to notes.
+        """
+        events = layout.events.events
+        for start, end in layout.events.slurs:
+            notes = [i for i in range(start, end + 1) if not events[i].is_rest]
+            if len(notes) > 1:
+                self._slur_starts[notes[0]] = (
+                    self._slur_starts.get(notes[0], 0) + 1
+                )
+                self._slur_stops[notes[-1]] = (
+                    self._slur_stops.get(notes[-1], 0) + 1
+                )
+
+    def unit_length(self) -> int:
+        """Unit length giving the shortest durations, as in xml2abc."""
+        pieces = [piece for m in self.layout.measures for piece in m]
+        return min(
+            UNIT_LENGTHS,
+            key=lambda unit: sum(
+                len(abc_duration(piece.length, unit)) for piece in pieces
+            ),
+        )
+
+    def write(self) -> str:
+        clef = self.layout.clef
+        clef_name = CLEFS[f"{clef.sign}{clef.line}"] + OCTAVE_CHANGES.get(
+            clef.octaveChange, ""
+        )
+        lines = ["X:1"]
+        lines.extend("T:" + line.strip() for line in self.title.splitlines())
+        lines.append("C:Grove / Null Identity")
+        lines.append(f"L:1/{self.unit}")
+        lines.append("M:16/1")
+        lines.append("I:linebreak $")
+        lines.append(f"K:{self.key}")
+        lines.append(f"V:1 {clef_name} ")
+        lines.append("V:1")
+
+        measures: list[str] = []
+        lyrics: list[str] = []
+        for i, measure in enumerate(self.layout.measures):
+            bar = "|]" if i == len(self.layout.measures) - 1 else "|"
+            notes, syllables = self.measure(measure)
+            measures.append(notes + " " + bar)
+            if any(syllables):
+                lyrics.append(" ".join(s or "*" for s in syllables))
+            else:
+                lyrics.append("")
+        has_lyrics = any(lyrics)
+        number = 0
+        while measures:
+            count = 1
+            chunk = measures[0]
+            while (
+                count < len(measures)
+                and len(chunk) + len(measures[count]) < CHARS_PER_LINE
+            ):
+                chunk += measures[count]
+                count += 1
+            number += count
+            lines.append(f"{chunk} %%{number}")
+            if has_lyrics:
+                lines.append("w: " + "|".join(lyrics[:count]) + "|")
+            del measures[:count], lyrics[:count]
+        return "\n".join(lines) + "\n"
+
+    def measure(self, measure: list[Piece]) -> tuple[str, list[str]]:
+        """Notes of a measure and syllables of its pitched notes."""
+        alters: dict[str, int] = {}
+        """Passing accidentals."""
+        notes = []
+        syllables = []
+        for piece in measure:
+            event = self.layout.events.events[piece.index]
+            duration = abc_duration(piece.length, self.unit)
+            if piece.pitch is None:
+                note = "z" + duration
+            else:
+                before = ""
+                if piece.is_first:
+                    before += "(" * self._slur_starts.get(piece.index, 0)
+                if piece.is_last:
+                    articulations = self.layout.articulations[piece.index]
+                    before += "".join(
+                        decoration
+                        for name, decoration in ORNAMENTS.items()
+                        if name in articulations
+                    )
+                note = before + self.pitch(piece, alters) + duration
+                if piece.tie in ("start", "continue"):
+                    note += "-"
+                if piece.stops_slurs:
+                    note += ")" * self._slur_stops.get(piece.index, 0)
+                syllable = ""
+                if piece.is_first and event.lyric is not None:
+                    syllable = abc_syllable(event.lyric)
+                syllables.append(syllable)
+            if piece.beam in ("continue", "end"):
+                notes.append(note)
+            else:
+                notes.append(" " + note)
+        return "".join(notes), syllables
+
+    def pitch(self, piece: Piece, alters: dict[str, int]) -> str:
+        """Pitch with an accidental if needed,
+        from the key and the passing `alters`, as in xml2abc.
+        """
+        pitch = piece.pitch
+        assert pitch is not None
+        octave = pitch.implicitOctave - self.layout.clef.octaveChange
+        name = abc_pitch(pitch.step, octave)
+        accidental = pitch.accidental
+        if accidental is None:
+            return name
+        alter = int(accidental.alter)
+        if accidental.displayStatus not in (True, None):
+            if name in alters:
+                if alter == alters[name]:
+                    return name
+            elif alter == self.key_alters.get(pitch.step, 0):
+                return name
+            if piece.tie in ("stop", "continue"):
+                return name
+        alters[name] = alter
+        return ACCIDENTALS[alter + 2] + name
+
+
+def render_abc(ctx: MaasContext, events: EventStream, title: str) -> str:
+    """ABC tune of events.
+    Raises `UnsupportedLayout` for events outside Grove's vocabulary,
+    which can still be converted from MusicXML.
+    """
+    return ABCWriter(ctx, lay_out(ctx, events), title).write()
@@ -0,0 +1,85 @@
+"""Lightweight intermediate representation of translated music,
+built into music21 objects only when needed.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Iterable, NamedTuple, Optional
+
+
+class NoteEvent(NamedTuple):
+    """A note or rest.
+    Notes are pitched by scale `degree` or by `pitch` name,
+    sized by `size_mode` (see `MaasContext.sizes`,
+    which also gives articulations) or by `length` in quarter notes.
+    """
+
+    degree: Optional[int] = None
+    pitch: Optional[str] = None
+    size_mode: Optional[str] = None
+    length: float = 0.0
+    lyric: Optional[str] = None
+
+    @property
+    def is_rest(self) -> bool:
+        return self.degree is None and self.pitch is None
+
+
+@dataclass
+class EventStream:
+    """Flat list of note events and the slurs over them."""
+
+    events: list[NoteEvent] = field(default_factory=list)
+    slurs: list[tuple[int, int]] = field(default_factory=list)
+    """Inclusive index ranges of slurred events."""
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def append(self, event: NoteEvent) -> None:
+        self.events.append(event)
+
+    def extend(self, other: EventStream) -> None:
+        offset = len(self.events)
+        self.events.extend(other.events)
+        self.slurs.extend(
+            (start + offset, end + offset) for start, end in other.slurs
+        )
+
+    @classmethod
+    def concat(cls, streams: Iterable[EventStream]) -> EventStream:
+        concatenated = cls()
+        for stream in streams:
+            concatenated.extend(stream)
+        return concatenated
+
+    def repeat(self, times: int) -> EventStream:
+        return self.concat([self] * times)
+
+    def slur(self) -> None:
+        """Slurs all events."""
+        if self.events:
+            self.slurs.append((0, len(self.events) - 1))
+
+    def is_slurred(self, index: int) -> bool:
+        return any(start <= index <= end for start, end in self.slurs)
+
+    def set_lyric(self, index: int, lyric: str) -> None:
+        self.events[index] = self.events[index]._replace(lyric=lyric)
+
+    def last_note(self) -> Optional[NoteEvent]:
+        for event in reversed(self.events):
+            if not event.is_rest:
+                return event
+        return None
+
+    def pop(self) -> NoteEvent:
+        """Removes the last event, and any slurs ending on it."""
+        index = len(self.events) - 1
+        self.slurs = [
+            (start, min(end, index - 1))
+            for start, end in self.slurs
+            if start < index
+        ]
+        return self.events.pop()
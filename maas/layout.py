@@ -0,0 +1,289 @@
+"""Lays out note events in measures, for writers which bypass music21's
+exporters while matching their notation.
+Only the durations Grove produces are covered,
+other events raise `UnsupportedLayout` so writers can fall back to music21.
+"""
+
+from __future__ import annotations
+
+from copy import deepcopy
+from dataclasses import dataclass
+from fractions import Fraction
+from functools import lru_cache
+from typing import Optional
+
+from music21.clef import (
+    Bass8vbClef,
+    BassClef,
+    PitchClef,
+    Treble8vaClef,
+    TrebleClef,
+)
+from music21.duration import Duration
+from music21.key import KeySignature
+from music21.pitch import Pitch
+
+from maas.events import EventStream, NoteEvent
+from maas.speech import MaasContext, SizeMode
+
+MEASURE_LENGTH = Fraction(64)
+"""Length of a 16/1 measure, see `MaasContext.build_score`."""
+UNBEAMED_TYPES = ("breve", "whole", "half", "quarter")
+
+ARTICULATIONS = {
+    "Staccato": "staccato",
+    "Staccatissimo": "staccatissimo",
+    "Tenuto": "tenuto",
+    "Accent": "accent",
+    "StrongAccent": "strong-accent",
+}
+"""MusicXML names of music21 articulation classes."""
+
+ACCIDENTALS = {
+    "sharp": "sharp",
+    "flat": "flat",
+    "natural": "natural",
+    "double-sharp": "double-sharp",
+    "double-flat": "flat-flat",
+}
+"""MusicXML names of music21 accidentals."""
+
+
+class UnsupportedLayout(ValueError):
+    pass
+
+
+@dataclass
+class Piece:
+    """Part of an event within a measure.
+    Events crossing barlines, or without a single note type,
+    are split into pieces, tied unless they are rests.
+    """
+
+    index: int
+    """Index of the event."""
+    offset: Fraction
+    length: Fraction
+    type: str
+    dots: int
+    pitch: Optional[Pitch]
+    is_first: bool
+    """Lyrics and slur starts are written on first pieces."""
+    is_last: bool
+    """Articulations are written on last pieces."""
+    stops_slurs: bool
+    """Slurs stop on the last piece before the barline."""
+    is_beamable: bool
+    tie: Optional[str] = None
+    beam: Optional[str] = None
+    stem: Optional[str] = None
+
+
+@dataclass
+class Layout:
+    events: EventStream
+    measures: list[list[Piece]]
+    articulations: list[list[str]]
+    """Articulation names by event."""
+    clef: PitchClef
+
+    def slur_numbers(self) -> list[int]:
+        """MusicXML numbers of slurs, assigned the same way as music21."""
+        return [(i % 6) + 1 for i in range(len(self.events.slurs))]
+
+
+def event_length(
+    ctx: MaasContext, event: NoteEvent
+) -> tuple[Fraction, list[str]]:
+    """Length and articulation names of an event."""
+    if event.size_mode is None:
+        return Fraction(event.length), []
+    duration, articulations = ctx.sizes[SizeMode(event.size_mode)]
+    names = []
+    for articulation in articulations:
+        name = ARTICULATIONS.get(type(articulation).__name__)
+        if name is None:
+            raise UnsupportedLayout(f"unsupported articulation {articulation}")
+        names.append(name)
+    return Fraction(duration.quarterLength), names
+
+
+def event_pitch(ctx: MaasContext, event: NoteEvent) -> Optional[Pitch]:
+    if event.degree is not None:
+        return ctx.pitch_from_degree(event.degree)
+    if event.pitch is not None:
+        return Pitch(event.pitch)
+    return None
+
+
+def syllabic(lyric: str) -> tuple[str, str]:
+    """Syllabic type and text of a lyric,
+    same as `music21.note.Lyric.setTextAndSyllabic`.
+    """
+    begins, ends = lyric.startswith("-"), lyric.endswith("-")
+    if begins and not ends:
+        return "end", lyric[1:]
+    if ends and not begins:
+        return "begin", lyric[:-1]
+    if begins and ends:
+        return "middle", lyric[1:-1]
+    return "single", lyric
+
+
+def best_clef(pitches: list[Pitch]) -> PitchClef:
+    """Same as `music21.clef.bestClef`."""
+    height = 0
+    for pitch in pitches:
+        height += pitch.diatonicNoteNum
+        if pitch.diatonicNoteNum > 33:
+            height += 3
+        elif pitch.diatonicNoteNum < 24:
+            height -= 3
+    average = height / len(pitches) if pitches else 29.0
+    if average > 49:
+        return Treble8vaClef()
+    if average > 28:
+        return TrebleClef()
+    if average > 10:
+        return BassClef()
+    return Bass8vbClef()
+
+
+@lru_cache(maxsize=None)
+def _components(length: Fraction) -> tuple[tuple[Fraction, str, int], ...]:
+    """Lengths, types and dots of the notes written for a length,
+    same as music21.
+    """
+    duration = Duration(length)
+    if duration.tuplets or duration.type == "inexpressible":
+        raise UnsupportedLayout(f"unsupported length {length}")
+    return tuple(
+        (Fraction(c.quarterLength), c.type, c.dots)
+        for c in duration.components
+    )
+
+
+def _beam(measure: list[Piece], clef: Optional[PitchClef]) -> None:
+    """Beams consecutive eighth notes,
+    as a 16/1 measure is a single beam group.
+    Stems are set from the `clef`, if given.
+    """
+    runs: list[list[Piece]] = [[]]
+    for piece in measure:
+        if piece.is_beamable:
+            runs[-1].append(piece)
+        elif runs[-1]:
+            runs.append([])
+    for run in runs:
+        if len(run) > 1:
+            stem = None
+            if clef is not None:
+                stem = clef.getStemDirectionForPitches(
+                    [piece.pitch for piece in run]
+                )
+            for piece in run:
+                piece.beam = "continue"
+                piece.stem = stem
+            run[0].beam = "begin"
+            run[-1].beam = "end"
+
+
+def lay_out(ctx: MaasContext, events: EventStream) -> Layout:
+    """Splits events into measures and ties,
+    and sets accidentals and beams the same way as music21's `makeNotation`.
+    """
+    if not events:
+        raise UnsupportedLayout("no events")
+    altered = KeySignature(ctx.key.sharps).alteredPitches
+    measures: list[list[Piece]] = []
+    articulations: list[list[str]] = []
+    pitches: list[Pitch] = []
+    measure_pitches: list[Pitch] = []
+    past_measure_pitches: list[Pitch] = []
+    offset = Fraction(0)
+    for index, event in enumerate(events.events):
+        length, names = event_length(ctx, event)
+        articulations.append(names)
+        if length <= 0:
+            raise UnsupportedLayout(f"unsupported length {length}")
+        number, measure_offset = divmod(offset, MEASURE_LENGTH)
+        if number == len(measures):
+            measures.append([])
+            past_measure_pitches = measure_pitches
+            measure_pitches = []
+        pitch = event_pitch(ctx, event)
+        if pitch is not None:
+            # accidentals are set before splitting, as in music21
+            pitch.updateAccidentalDisplay(
+                pitchPast=measure_pitches,
+                pitchPastMeasure=past_measure_pitches,
+                alteredPitches=list(altered),
+                cautionaryPitchClass=True,
+                cautionaryNotImmediateRepeat=True,
+            )
+            if (
+                pitch.accidental is not None
+                and pitch.accidental.name not in ACCIDENTALS
+            ):
+                raise UnsupportedLayout(f"unsupported pitch {pitch}")
+            measure_pitches.append(pitch)
+            pitches.append(pitch)
+        head = min(length, MEASURE_LENGTH - measure_offset)
+        parts = [_components(head)]
+        if head < length:
+            parts.append(_components(length - head))
+        count = sum(map(len, parts))
+        position = 0
+        for i, components in enumerate(parts):
+            if i:
+                measures.append([])
+                past_measure_pitches = measure_pitches
+                measure_pitches = []
+                measure_offset = Fraction(0)
+            for j, (piece_length, type_, dots) in enumerate(components):
+                piece_pitch = pitch
+                tie = None
+                if pitch is not None and position:
+                    # tied over, as in music21
+                    piece_pitch = deepcopy(pitch)
+                    if piece_pitch.accidental is not None:
+                        piece_pitch.accidental.displayStatus = False
+                if pitch is not None and count > 1:
+                    if position == 0:
+                        tie = "start"
+                    elif position == count - 1:
+                        tie = "stop"
+                    else:
+                        tie = "continue"
+                is_simple = len(components) == 1
+                if is_simple and type_ not in UNBEAMED_TYPES:
+                    if type_ != "eighth" or dots:
+                        raise UnsupportedLayout(f"unsupported beaming {type_}")
+                measures[-1].append(
+                    Piece(
+                        index,
+                        measure_offset,
+                        piece_length,
+                        type_,
+                        dots,
+                        piece_pitch,
+                        is_first=position == 0,
+                        is_last=position == count - 1,
+                        stops_slurs=i == 0 and j == len(components) - 1,
+                        is_beamable=(
+                            is_simple
+                            and pitch is not None
+                            and type_ not in UNBEAMED_TYPES
+                        ),
+                        tie=tie,
+                    )
+                )
+                measure_offset += piece_length
+                position += 1
+        offset += length
+    clef = best_clef(pitches)
+    # music21 only finds the clef, and so sets stems, in the first measure
+    _beam(measures[0], clef)
+    for measure in measures[1:]:
+        _beam(measure, None)
+    return Layout(events, measures, articulations, clef)
@@ -5,7 +5,12 @@ from django.conf import settings
 from django.core.management.base import BaseCommand, CommandParser
 from jangle.models import LanguageTag
 
-from maas.models import Lexeme, LexemeTranslation, NativeLang
+from maas.models import (
+    Lexeme,
+    LexemeTranslation,
+    NativeLang,
+    lexicon_version,
+)
 
 
 class Command(BaseCommand):
@@ -83,3 +88,5 @@ class Command(BaseCommand):
                         f.read(), settings.YAML_LOADER
                     )
                 )
+        # servers rebuild their lexicon caches once they see the new version
+        lexicon_version.invalidate()
@@ -0,0 +1,113 @@
+"""Standard MIDI File writer for note events,
+for playback without writing MusicXML or ABC.
+"""
+
+from __future__ import annotations
+
+import struct
+from fractions import Fraction
+from functools import lru_cache
+from typing import Iterator
+
+from music21.pitch import Pitch
+
+from maas.events import EventStream, NoteEvent
+from maas.speech import MaasContext, SizeMode
+
+TICKS_PER_QUARTER = 10080
+"""Same as `maas.musicxml.DIVISIONS`, so every length Grove writes
+is a whole number of ticks.
+"""
+TEMPO = 500000
+"""Microseconds per quarter note, 120 BPM as in music21."""
+VELOCITY = 90
+"""Same as music21's default velocity."""
+CHANNEL = 0
+CHUNK_SIZE = 8192
+"""Bytes of track data per chunk yielded by `iter_midi`."""
+
+
+def _variable_length(value: int) -> bytes:
+    """MIDI variable-length quantity."""
+    data = bytearray([value & 0x7F])
+    value >>= 7
+    while value:
+        data.append((value & 0x7F) | 0x80)
+        value >>= 7
+    return bytes(reversed(data))
+
+
+def _meta(delta: int, type_: int, data: bytes) -> bytes:
+    return (
+        _variable_length(delta)
+        + bytes((0xFF, type_))
+        + _variable_length(len(data))
+        + data
+    )
+
+
+@lru_cache(maxsize=None)
+def _pitch_midi(name: str) -> int:
+    return Pitch(name).midi
+
+
+def event_ticks(ctx: MaasContext, event: NoteEvent) -> int:
+    """Length of an event in ticks, from `ctx.sizes` if it has a size mode."""
+    if event.size_mode is None:
+        length = Fraction(event.length)
+    else:
+        duration, _ = ctx.sizes[SizeMode(event.size_mode)]
+        length = Fraction(duration.quarterLength)
+    return round(length * TICKS_PER_QUARTER)
+
+
+def midi_track(ctx: MaasContext, events: EventStream, title: str) -> bytes:
+    """Data of the single track of a MIDI file of events,
+    without its chunk header.
+    """
+    track = bytearray()
+    track += _meta(0, 0x03, title.encode())
+    track += _meta(0, 0x51, TEMPO.to_bytes(3, "big"))
+    # 16/1, with 24 clocks per metronome click and 8 32nds per quarter
+    track += _meta(0, 0x58, bytes((16, 0, 24, 8)))
+    track += _meta(0, 0x59, struct.pack(">bB", ctx.key.sharps, 0))
+    degrees = [e.degree for e in events.events if e.degree is not None]
+    pitches = iter(ctx.degree_table.lookup(degrees))
+    note_on = 0x90 | CHANNEL
+    note_off = 0x80 | CHANNEL
+    delta = 0
+    for event in events.events:
+        ticks = event_ticks(ctx, event)
+        if event.degree is not None:
+            midi = next(pitches).midi
+        elif event.pitch is not None:
+            midi = _pitch_midi(event.pitch)
+        else:
+            delta += ticks
+            continue
+        if ticks <= 0 or not 0 <= midi <= 127:
+            delta += max(ticks, 0)
+            continue
+        track += _variable_length(delta)
+        track += bytes((note_on, midi, VELOCITY))
+        track += _variable_length(ticks)
+        track += bytes((note_off, midi, 0))
+        delta = 0
+    track += _meta(delta, 0x2F, b"")
+    return bytes(track)
+
+
+def iter_midi(
+    ctx: MaasContext, events: EventStream, title: str
+) -> Iterator[bytes]:
+    """Chunks of a format 0 Standard MIDI File of events."""
+    yield b"MThd" + struct.pack(">IHHH", 6, 0, 1, TICKS_PER_QUARTER)
+    track = midi_track(ctx, events, title)
+    yield b"MTrk" + struct.pack(">I", len(track))
+    for i in range(0, len(track), CHUNK_SIZE):
+        yield track[i : i + CHUNK_SIZE]
+
+
+def render_midi(ctx: MaasContext, events: EventStream, title: str) -> bytes:
+    """Standard MIDI File of events."""
+    return b"".join(iter_midi(ctx, events, title))
@@ -1,14 +1,22 @@
+from functools import lru_cache
+from threading import Lock
+from typing import Optional
+
+from django.conf import settings
 from django.db import models
 from jangle.models import LanguageTag
-from music21.stream.base import Score, Stream
+from music21.stream.base import Stream
 
+from maas.events import EventStream, NoteEvent
 from maas.speech import (
     FLEX_NOTE_RE,
     AbstractFlexNote,
+    FlexNoteTemplate,
     MaasSpeech,
     SizeMode,
     Tone,
 )
+from maas.versions import TableVersion
 
 
 class NativeLang:
@@ -59,26 +67,37 @@ class Lexeme(models.Model):
             rel.flex_note for rel in self.flex_note_through.order_by("index")  # type: ignore
         ]
 
+    def events(self, speech: MaasSpeech, exclude_ghosted=False) -> EventStream:
+        ctx = speech.ctx
+        if self.pk is not None:
+            lexicon_version.check()
+            if notes := lexeme_events(
+                self,
+                speech.degree,
+                ctx.upper_sat_degree,
+                ctx.lower_sat_degree,
+                exclude_ghosted,
+                ctx.lyrics_lang,
+            ):
+                return EventStream(list(notes))
+
+        events = EventStream(list(ctx.fallback_events.events))
+        if ctx.lyrics_lang is not None and events:
+            events.set_lyric(0, self.translate(ctx.lyrics_lang))
+        return events
+
     def stream(self, speech: MaasSpeech, exclude_ghosted=False) -> Stream:
-        flex_notes = self.get_flex_notes()
-        if exclude_ghosted:
-            flex_notes = filter(lambda flex: not flex.is_ghosted, flex_notes)
-
-        if notes := [flex.get_note(speech) for flex in flex_notes]:
-            stream = Score(notes)
-        else:
-            stream = Score(speech.ctx.lexeme_fallback).flatten()
-        if speech.ctx.lyrics_lang is not None:
-            stream.notesAndRests[0].addLyric(
-                self.translate(speech.ctx.lyrics_lang), 1
-            )
-        return stream
+        return speech.ctx.build_stream(self.events(speech, exclude_ghosted))
 
     def translate(self, lang: LanguageTag) -> str:
-        try:
-            return self.translations.get(lang=lang).word
-        except LexemeTranslation.DoesNotExist:
-            return self.translations.get(lang=NativeLang()).word
+        word = lexeme_words.get(self.pk, lang)
+        if word is None:
+            word = lexeme_words.get(self.pk, NativeLang())
+        if word is None:
+            raise LexemeTranslation.DoesNotExist(
+                f"lexeme {self.pk} has no {lang} or native word"
+            )
+        return word
 
     def __str__(self):
         return self.translate(NativeLang())
@@ -123,3 +142,196 @@ class LexemeFlexNote(models.Model):
     class Meta:
         unique_together = ("lexeme", "index")
         ordering = ["lexeme", "index"]
+
+
+LexemeTemplate = tuple[FlexNoteTemplate, ...]
+lexicon_version = TableVersion(LexemeTranslation, LexemeFlexNote)
+"""Version of the lexicon, which its in-memory caches check."""
+
+
+class FlexNoteTemplates:
+    """Process-wide, read-only map of lexeme ids to their flex notes,
+    so rendering lexemes doesn't query the database.
+    Loaded for the whole lexicon on first use,
+    and again once `version` changes.
+    """
+
+    def __init__(self, version: TableVersion) -> None:
+        self._templates: Optional[dict[int, LexemeTemplate]] = None
+        self._lock = Lock()
+        self._version = version
+        version.register(self.clear)
+
+    def _load(self) -> dict[int, LexemeTemplate]:
+        rows = LexemeFlexNote.objects.order_by("lexeme", "index").values_list(
+            "lexeme",
+            "flex_note__size_mode",
+            "flex_note__tone",
+            "flex_note__degree",
+            "flex_note__is_ghosted",
+        )
+        templates: dict[int, list[FlexNoteTemplate]] = {}
+        for lexeme_id, size_mode, tone, degree, is_ghosted in rows:
+            templates.setdefault(lexeme_id, []).append(
+                FlexNoteTemplate(
+                    SizeMode(size_mode), Tone(tone), degree, is_ghosted
+                )
+            )
+        return {
+            lexeme_id: tuple(flex_notes)
+            for lexeme_id, flex_notes in templates.items()
+        }
+
+    def load(self) -> None:
+        """(Re)builds the templates from the database."""
+        templates = self._load()
+        with self._lock:
+            self._templates = templates
+
+    def clear(self) -> None:
+        with self._lock:
+            self._templates = None
+
+    @property
+    def templates(self) -> dict[int, LexemeTemplate]:
+        self._version.check()
+        templates = self._templates
+        if templates is None:
+            with self._lock:
+                templates = self._templates
+                if templates is None:
+                    templates = self._templates = self._load()
+        return templates
+
+    def get(self, lexeme_id: Optional[int]) -> LexemeTemplate:
+        """Flex notes of a lexeme in order, empty for unsaved lexemes."""
+        return self.templates.get(lexeme_id, ())  # type: ignore
+
+
+flex_note_templates = FlexNoteTemplates(lexicon_version)
+
+
+class LexemeWords:
+    """Process-wide, read-only maps of lexeme ids to their words,
+    so lyrics don't query the database.
+    Each language is loaded on first use,
+    and again once `version` changes.
+    """
+
+    def __init__(self, version: TableVersion) -> None:
+        self._words: dict[int, dict[int, str]] = {}
+        self._lock = Lock()
+        self._version = version
+        version.register(self.clear)
+
+    def _load(self, lang: LanguageTag) -> dict[int, str]:
+        return dict(
+            LexemeTranslation.objects.filter(lang=lang).values_list(
+                "lexeme", "word"
+            )
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._words = {}
+
+    def words(self, lang: LanguageTag) -> dict[int, str]:
+        self._version.check()
+        words = self._words.get(lang.pk)
+        if words is None:
+            with self._lock:
+                words = self._words.get(lang.pk)
+                if words is None:
+                    words = self._words[lang.pk] = self._load(lang)
+        return words
+
+    def get(
+        self, lexeme_id: Optional[int], lang: LanguageTag
+    ) -> Optional[str]:
+        return self.words(lang).get(lexeme_id)  # type: ignore
+
+
+lexeme_words = LexemeWords(lexicon_version)
+
+
+class LexemeIndex:
+    """Process-wide, read-only map of `(lang_id, word)` to lexemes,
+    so parsing phrases doesn't query the database.
+    Loaded for the whole lexicon on first use,
+    and again once `version` changes.
+    """
+
+    def __init__(self, version: TableVersion) -> None:
+        self._lexemes: Optional[dict[tuple[int, str], Lexeme]] = None
+        self._lock = Lock()
+        self._version = version
+        version.register(self.clear)
+
+    def _load(self) -> dict[tuple[int, str], Lexeme]:
+        rows = LexemeTranslation.objects.values_list("lang", "word", "lexeme")
+        lexemes: dict[int, Lexeme] = {}
+        index = {}
+        for lang_id, word, lexeme_id in rows:
+            if lexeme_id not in lexemes:
+                lexemes[lexeme_id] = Lexeme.from_db(
+                    rows.db, ["id"], [lexeme_id]
+                )
+            index[lang_id, word] = lexemes[lexeme_id]
+        return index
+
+    def load(self) -> None:
+        """(Re)builds the index from the database."""
+        lexemes = self._load()
+        with self._lock:
+            self._lexemes = lexemes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lexemes = None
+
+    @property
+    def lexemes(self) -> dict[tuple[int, str], Lexeme]:
+        self._version.check()
+        lexemes = self._lexemes
+        if lexemes is None:
+            with self._lock:
+                lexemes = self._lexemes
+                if lexemes is None:
+                    lexemes = self._lexemes = self._load()
+        return lexemes
+
+    def get(self, word: str, lang: LanguageTag) -> Optional[Lexeme]:
+        return self.lexemes.get((lang.pk, word))
+
+
+lexeme_index = LexemeIndex(lexicon_version)
+
+
+@lru_cache(maxsize=settings.LEXEME_EVENTS_CACHE_SIZE)
+def lexeme_events(
+    lexeme: Lexeme,
+    degree: int,
+    upper_sat_degree: int,
+    lower_sat_degree: int,
+    exclude_ghosted: bool,
+    lyrics_lang: Optional[LanguageTag],
+) -> tuple[NoteEvent, ...]:
+    """Events of a lexeme's flex notes at a speech's degree,
+    empty if it has none.
+    Memoized, as common lexemes are rendered with the same inputs
+    over and over, see `lexeme_events.cache_info` and `.cache_clear`.
+    """
+    events = []
+    for flex in flex_note_templates.get(lexeme.pk):
+        if exclude_ghosted and flex.is_ghosted:
+            continue
+        relative = flex.tone_degree(upper_sat_degree, lower_sat_degree)
+        events.append(
+            NoteEvent(degree=degree + relative, size_mode=flex.size_mode)
+        )
+    if lyrics_lang is not None and events:
+        events[0] = events[0]._replace(lyric=lexeme.translate(lyrics_lang))
+    return tuple(events)
+
+
+lexicon_version.register(lexeme_events.cache_clear)
@@ -1,7 +1,8 @@
 import math
 import re
 from dataclasses import dataclass, field
-from typing import Optional, Tuple
+from functools import cached_property, lru_cache
+from typing import Iterable, NamedTuple, Optional, Tuple
 
 from django.conf import settings
 from django.db import models
@@ -12,10 +13,13 @@ from music21.duration import Duration
 from music21.key import Key, KeySignature
 from music21.metadata import Metadata
 from music21.meter.base import SenzaMisuraTimeSignature, TimeSignature
-from music21.note import Note, Rest
+from music21.note import GeneralNote, Note, Rest
 from music21.pitch import Pitch
+from music21.spanner import Slur
 from music21.stream.base import Part, Score, Stream
 
+from maas.events import EventStream, NoteEvent
+
 UPPER_SAT_DEGREE = 4
 LOWER_SAT_DEGREE = -4
 
@@ -24,6 +28,9 @@ DOWN_DEGREE = -2
 
 GHOSTED_TOKEN = "~"
 
+DEGREE_TABLE_SHIFTS = 4
+"""Phrase shifts up and down covered by `MaasContext.degree_table`."""
+
 
 class Tone(models.TextChoices):
     NUCLEUS = "N", "nucleus"
@@ -68,6 +75,59 @@ FLEX_NOTE_RE = re.compile(
     )
 )
 
+
+class DegreePitch(NamedTuple):
+    name: str
+    octave: int
+    midi: int
+
+    def pitch(self) -> Pitch:
+        if len(self.name) == 1:
+            return Pitch(step=self.name, octave=self.octave)
+        return Pitch(
+            step=self.name[0], octave=self.octave, accidental=self.name[1:]
+        )
+
+
+class DegreeTable:
+    """Pitches of scale degrees `low` to `high` in a key.
+    Degrees outside the range are still pitched, without the table.
+    """
+
+    def __init__(self, key: Key, low: int, high: int) -> None:
+        self.key = key
+        self.low = low
+        self.high = high
+        self.pitches = tuple(
+            self._pitch(degree) for degree in range(low, high + 1)
+        )
+
+    def _pitch(self, degree: int) -> DegreePitch:
+        pitch = self.key.pitchFromDegree((degree % 7) + 1)
+        if pitch is None:
+            raise ValueError(f"could not get pitch from degree {degree}")
+        pitch.octave = pitch.implicitOctave + (math.floor(degree / 7))
+        return DegreePitch(pitch.name, pitch.octave, pitch.midi)
+
+    def __getitem__(self, degree: int) -> DegreePitch:
+        if self.low <= degree <= self.high:
+            return self.pitches[degree - self.low]
+        return self._pitch(degree)
+
+    def lookup(self, degrees: Iterable[int]) -> list[DegreePitch]:
+        """Pitches of many degrees, such as a sentence's, in one pass."""
+        low, high, pitches = self.low, self.high, self.pitches
+        return [
+            pitches[degree - low] if low <= degree <= high else self[degree]
+            for degree in degrees
+        ]
+
+
+@lru_cache(maxsize=64)
+def degree_table(tonic: str, mode: str, low: int, high: int) -> DegreeTable:
+    return DegreeTable(Key(tonic, mode), low, high)
+
+
 @dataclass
 class MaasContext:
     key: Key = Key("B")
@@ -85,6 +145,85 @@ class MaasContext:
     peri_rest: float = 4.0
     comm_rest: float = 1.0
 
+    @property
+    def degree_table(self) -> DegreeTable:
+        """Shared by contexts with the same key and degree settings,
+        which give the range of degrees speeches usually reach.
+        """
+        degree_settings = (
+            self.key,
+            self.degree_offset,
+            self.lower_sat_degree,
+            self.upper_sat_degree,
+            self.phrase_down_degree,
+            self.phrase_up_degree,
+        )
+        cached = self.__dict__.get("_degree_table")
+        if (
+            cached is not None
+            and cached[0][0] is self.key
+            and cached[0][1:] == degree_settings[1:]
+        ):
+            return cached[1]
+        shift = DEGREE_TABLE_SHIFTS * max(
+            abs(self.phrase_down_degree), abs(self.phrase_up_degree)
+        )
+        sats = (0, self.lower_sat_degree, self.upper_sat_degree)
+        table = degree_table(
+            self.key.tonic.name,
+            self.key.mode,
+            self.degree_offset + min(sats) - shift - 7,
+            self.degree_offset + max(sats) + shift + 7,
+        )
+        self.__dict__["_degree_table"] = (degree_settings, table)
+        return table
+
+    def pitch_from_degree(self, degree: int) -> Pitch:
+        return self.degree_table[degree].pitch()
+
+    @cached_property
+    def fallback_events(self) -> EventStream:
+        """`lexeme_fallback` as note events.
+        Chords are reduced to their lowest pitch.
+        """
+        events = EventStream()
+        for element in Score(self.lexeme_fallback).flatten().notesAndRests:
+            if element.isRest:
+                events.append(NoteEvent(length=element.quarterLength))
+            else:
+                events.append(
+                    NoteEvent(
+                        pitch=element.pitches[0].nameWithOctave,
+                        length=element.quarterLength,
+                    )
+                )
+        return events
+
+    def build_note(self, event: NoteEvent) -> GeneralNote:
+        if event.is_rest:
+            note = Rest()
+        elif event.degree is not None:
+            note = Note(self.pitch_from_degree(event.degree))
+        else:
+            note = Note(event.pitch)
+        if event.size_mode is not None:
+            duration, articulations = self.sizes[SizeMode(event.size_mode)]
+            note.duration = Duration(duration.quarterLength)
+            note.articulations = [type(art)() for art in articulations]
+        else:
+            note.quarterLength = event.length
+        if event.lyric is not None:
+            note.addLyric(event.lyric, 1)
+        return note
+
+    def build_stream(self, events: EventStream) -> Stream:
+        """Builds music21 objects from note events."""
+        notes = [self.build_note(event) for event in events.events]
+        stream = Stream(notes)
+        for start, end in events.slurs:
+            stream.insert(0, Slur(notes[start : end + 1]))
+        return stream
+
     def build_score(self, title: str, stream: Stream) -> Score:
         part = Part()
         # part.append(MetronomeMark(number=240))
@@ -149,18 +288,26 @@ class AbstractFlexNote:
             self_str += str(abs(self.degree))
         return self_str
 
-    def get_pitch(self, speech: MaasSpeech) -> Pitch:
-        degree = speech.degree
+    def tone_degree(self, upper_sat_degree: int, lower_sat_degree: int) -> int:
+        """Degree relative to the speech's degree."""
         if self.tone == Tone.UPPER_SAT:
-            degree += speech.ctx.upper_sat_degree
-        elif self.tone == Tone.LOWER_SAT:
-            degree += speech.ctx.lower_sat_degree
-        degree += self.degree
-        pitch = speech.ctx.key.pitchFromDegree((degree % 7) + 1)
-        if pitch is None:
-            raise ValueError(f"could not get pitch from degree {degree}")
-        pitch.octave = pitch.implicitOctave + (math.floor(degree / 7))
-        return pitch
+            return upper_sat_degree + self.degree
+        if self.tone == Tone.LOWER_SAT:
+            return lower_sat_degree + self.degree
+        return self.degree
+
+    def get_degree(self, speech: MaasSpeech) -> int:
+        return speech.degree + self.tone_degree(
+            speech.ctx.upper_sat_degree, speech.ctx.lower_sat_degree
+        )
+
+    def get_pitch(self, speech: MaasSpeech) -> Pitch:
+        return speech.ctx.pitch_from_degree(self.get_degree(speech))
+
+    def get_event(self, speech: MaasSpeech) -> NoteEvent:
+        return NoteEvent(
+            degree=self.get_degree(speech), size_mode=self.size_mode
+        )
 
     def get_note(self, speech: MaasSpeech) -> Note:
         pitch = self.get_pitch(speech)
@@ -169,3 +316,19 @@ class AbstractFlexNote:
         if self.is_ghosted:
             pass
         return note
+
+
+class FlexNoteTemplate(NamedTuple):
+    """Immutable flex note, read once from the database,
+    see `maas.models.flex_note_templates`.
+    """
+
+    size_mode: SizeMode
+    tone: Tone
+    degree: int
+    is_ghosted: bool
+
+    __str__ = AbstractFlexNote.__str__
+    tone_degree = AbstractFlexNote.tone_degree
+    get_degree = AbstractFlexNote.get_degree
+    get_event = AbstractFlexNote.get_event
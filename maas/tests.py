@@ -1,3 +1,164 @@
-from django.test import TestCase
+import re
+from io import BytesIO, StringIO
+from zipfile import ZipFile
 
-# Create your tests here.
+from django.test import SimpleTestCase
+from music21 import converter
+from music21.key import Key
+from music21.musicxml.m21ToXml import GeneralObjectExporter
+
+import xml2abc_mod
+from maas.abc import render_abc
+from maas.events import EventStream, NoteEvent
+from maas.layout import lay_out
+from maas.midi import render_midi
+from maas.musicxml import write_musicxml, write_mxl
+from maas.speech import (
+    HALVED_SIZES,
+    DegreeTable,
+    MaasContext,
+    SizeMode,
+    degree_table,
+)
+
+TITLE = "Grove & co"
+
+
+def fixed_events(slurs=True) -> EventStream:
+    """Notes by degree and by pitch, rests and lyrics,
+    with a slur ending on a note.
+    """
+    events = EventStream(
+        [
+            NoteEvent(degree=0, size_mode=SizeMode.LARGE, lyric="grove"),
+            NoteEvent(degree=4, size_mode=SizeMode.MEDIUM, lyric="wal-"),
+            NoteEvent(degree=-3, size_mode=SizeMode.SMALL, lyric="-king"),
+            NoteEvent(length=1.0),
+            NoteEvent(degree=9, size_mode=SizeMode.SMALL),
+            NoteEvent(pitch="F#4", length=1.5, lyric="a&b"),
+            NoteEvent(degree=-8, size_mode=SizeMode.MEDIUM),
+            NoteEvent(length=4.0),
+            NoteEvent(degree=2, size_mode=SizeMode.LARGE, lyric="end"),
+        ]
+    )
+    if slurs:
+        events.slurs.extend([(0, 2), (4, 6)])
+    return events
+
+
+def normalized_musicxml(musicxml: str) -> str:
+    """MusicXML without its random part id and encoding details."""
+    musicxml = re.sub(r"P[0-9a-f]{32}", "P", musicxml)
+    return re.sub(r"<encoding>.*?</encoding>", "", musicxml, flags=re.S)
+
+
+class WriterTests(SimpleTestCase):
+    """Grove's writers against music21's export of the same events."""
+
+    contexts = (
+        MaasContext(),
+        MaasContext(key=Key("E-"), sizes=HALVED_SIZES),
+        MaasContext(key=Key("c#")),
+    )
+
+    def music21_musicxml(self, ctx: MaasContext, events: EventStream) -> str:
+        score = ctx.build_score(TITLE, ctx.build_stream(events))
+        return GeneralObjectExporter(score).parse().decode()
+
+    def test_musicxml(self):
+        for ctx in self.contexts:
+            with self.subTest(key=ctx.key):
+                events = fixed_events()
+                # laid out by Grove, not written by the music21 fallback
+                lay_out(ctx, events)
+                musicxml = StringIO()
+                write_musicxml(ctx, events, TITLE, musicxml)
+                self.assertEqual(
+                    normalized_musicxml(musicxml.getvalue()),
+                    normalized_musicxml(self.music21_musicxml(ctx, events)),
+                )
+
+    def test_mxl(self):
+        ctx = MaasContext()
+        events = fixed_events()
+        mxl = BytesIO()
+        write_mxl(ctx, events, TITLE, mxl)
+        with ZipFile(mxl) as zipped:
+            musicxml = zipped.read("score.musicxml").decode()
+        self.assertEqual(
+            normalized_musicxml(musicxml),
+            normalized_musicxml(self.music21_musicxml(ctx, events)),
+        )
+
+    def test_abc(self):
+        # xml2abc drops the slurs render_abc writes
+        for ctx in self.contexts:
+            with self.subTest(key=ctx.key):
+                events = fixed_events(slurs=False)
+                self.assertEqual(
+                    render_abc(ctx, events, TITLE),
+                    xml2abc_mod.convert(
+                        self.music21_musicxml(ctx, events).encode()
+                    ),
+                )
+
+    def test_midi(self):
+        for ctx in self.contexts:
+            with self.subTest(key=ctx.key):
+                events = fixed_events()
+                midi = converter.parse(
+                    render_midi(ctx, events, TITLE), format="midi"
+                )
+                score = ctx.build_score(TITLE, ctx.build_stream(events))
+                self.assertEqual(
+                    [
+                        (n.offset, n.quarterLength, n.pitch.midi)
+                        for n in midi.flatten().notes
+                    ],
+                    [
+                        (n.offset, n.quarterLength, n.pitch.midi)
+                        for n in score.flatten().notes
+                    ],
+                )
+
+
+class DegreeTableTests(SimpleTestCase):
+    def music21_pitch(self, key: Key, degree: int):
+        """Pitch of a degree as speeches computed it before the table."""
+        pitch = key.pitchFromDegree((degree % 7) + 1)
+        pitch.octave = pitch.implicitOctave + degree // 7
+        return pitch
+
+    def test_pitches(self):
+        for key in (Key("B"), Key("E-"), Key("c#"), Key("a")):
+            table = DegreeTable(key, -10, 10)
+            for degree in range(-30, 31):
+                with self.subTest(key=key, degree=degree):
+                    expected = self.music21_pitch(key, degree)
+                    self.assertEqual(table[degree].pitch(), expected)
+                    self.assertEqual(table[degree].midi, expected.midi)
+
+    def test_lookup(self):
+        table = DegreeTable(Key("B"), -3, 3)
+        degrees = [-5, -3, 0, 3, 4, 20]
+        self.assertEqual(
+            table.lookup(degrees), [table[degree] for degree in degrees]
+        )
+
+    def test_context_table(self):
+        ctx = MaasContext()
+        table = ctx.degree_table
+        self.assertIs(ctx.degree_table, table)
+        self.assertIs(MaasContext().degree_table, table)
+        ctx.key = Key("E-")
+        self.assertIsNot(ctx.degree_table, table)
+        self.assertEqual(
+            ctx.pitch_from_degree(1), self.music21_pitch(Key("E-"), 1)
+        )
+        ctx.degree_offset = 20
+        self.assertLessEqual(ctx.degree_table.low, 20 - 4)
+        self.assertGreaterEqual(ctx.degree_table.high, 20 + 4)
+        self.assertIs(
+            degree_table("B", "major", -3, 3),
+            degree_table("B", "major", -3, 3),
+        )
@@ -0,0 +1,79 @@
+"""Cross-process invalidation of in-memory caches, see `TableVersion`."""
+
+from __future__ import annotations
+
+import time
+from threading import Lock
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.db import models
+
+Version = tuple[tuple[int, Optional[int]], ...]
+
+
+class TableVersion:
+    """Stamp of the tables process-wide caches are built from,
+    the row count and highest id of each,
+    which changes whenever a load command adds or deletes rows.
+    Caches call `check` before they're read, which clears them all
+    if another process changed the tables,
+    querying at most every `settings.TABLE_VERSION_CHECK_INTERVAL` seconds.
+    """
+
+    def __init__(self, *tables: type[models.Model]) -> None:
+        self.tables = tables
+        self._clears: list[Callable[[], None]] = []
+        self._version: Optional[Version] = None
+        self._checked = float("-inf")
+        self._lock = Lock()
+
+    def register(self, clear: Callable[[], None]) -> None:
+        """Adds a function clearing a cache built from the tables."""
+        self._clears.append(clear)
+
+    def _query(self) -> Version:
+        return tuple(
+            tuple(
+                table.objects.aggregate(
+                    count=models.Count("pk"), last=models.Max("pk")
+                ).values()
+            )
+            for table in self.tables
+        )
+
+    def _clear(self) -> None:
+        for clear in self._clears:
+            clear()
+
+    def check(self) -> None:
+        now = time.monotonic()
+        if now - self._checked < settings.TABLE_VERSION_CHECK_INTERVAL:
+            return
+        with self._lock:
+            if now - self._checked < settings.TABLE_VERSION_CHECK_INTERVAL:
+                return
+            version = self._query()
+            changed = self._version is not None and version != self._version
+            self._version = version
+            self._checked = now
+        if changed:
+            self._clear()
+
+    @property
+    def version(self) -> Version:
+        """The tables' stamp as of the latest check,
+        for keys of caches shared between processes.
+        """
+        self.check()
+        assert self._version is not None
+        return self._version
+
+    def invalidate(self) -> None:
+        """Clears the caches right away, in the process which changed
+        the tables, and records their new version.
+        """
+        with self._lock:
+            self._version = self._query()
+            self._checked = time.monotonic()
+        self._clear()
@@ -1,3 +1,3 @@
 #!/bin/sh
 
-python -m gunicorn grove.asgi:application -k uvicorn.workers.UvicornWorker
+python -m gunicorn grove.asgi:application -k uvicorn.workers.UvicornWorker --preload
@@ -1,6 +1,24 @@
 from django.apps import AppConfig
+from django.db import connections
 
 
 class TranslatorConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "translator"
+
+    def preload(self) -> None:
+        """Loads spaCy models, lexeme flex notes and the lexeme index
+        before the worker accepts requests.
+        Called from the ASGI / WSGI entrypoints instead of `ready`
+        so management commands don't pay for it.
+        With gunicorn's `--preload` this runs once in the master process,
+        and forked workers share the models' memory.
+        """
+        from maas.models import flex_note_templates, lexeme_index
+        from translator.translator import preload_nlp
+
+        preload_nlp()
+        flex_note_templates.load()
+        lexeme_index.load()
+        # forked workers must not share the master's connection
+        connections.close_all()
@@ -0,0 +1,85 @@
+"""Caches translation results, see the `translations` alias of
+`settings.CACHES`.
+"""
+
+import hashlib
+import json
+from dataclasses import fields
+from fractions import Fraction
+from typing import Any, Optional
+
+from django.core.cache import caches
+from jangle.models import LanguageTag
+from music21.articulations import Articulation
+from music21.base import Music21Object
+from music21.duration import Duration
+from music21.key import Key
+from music21.note import GeneralNote
+from music21.stream.base import Stream
+
+from carpet.index import dictionary_version
+from maas.models import lexicon_version
+from maas.speech import MaasContext
+
+
+def _canonical(value: Any) -> Any:
+    """JSON-serializable stand-in for a context value."""
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, Key):
+        return str(value)
+    if isinstance(value, Duration):
+        return value.quarterLength
+    if isinstance(value, Articulation):
+        return type(value).__name__
+    if isinstance(value, Stream):
+        return _canonical(list(value.flatten().notesAndRests))
+    if isinstance(value, GeneralNote):
+        return [
+            type(value).__name__,
+            value.quarterLength,
+            [p.nameWithOctave for p in value.pitches],
+        ]
+    if isinstance(value, (Music21Object, LanguageTag, Fraction)):
+        return str(value)
+    return value
+
+
+def context_fingerprint(ctx: MaasContext) -> dict[str, Any]:
+    return {f.name: _canonical(getattr(ctx, f.name)) for f in fields(ctx)}
+
+
+def fingerprint(*values: Any) -> str:
+    """Hash of texts, language tags, contexts etc."""
+    canonical = [
+        context_fingerprint(v) if isinstance(v, MaasContext) else _canonical(v)
+        for v in values
+    ]
+    return hashlib.sha256(
+        json.dumps(canonical, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def data_version() -> list[Any]:
+    """Stamps of the dictionary and lexicon,
+    so cached results are keyed by the data they were translated with.
+    """
+    return [dictionary_version.version, lexicon_version.version]
+
+
+def get_result(key: str) -> Optional[dict[str, Any]]:
+    return caches["translations"].get(key)
+
+
+def set_result(key: str, result: dict[str, Any]) -> None:
+    caches["translations"].set(key, result)
+
+
+def get_sentence(key: str) -> Optional[dict[str, Any]]:
+    return caches["sentences"].get(key)
+
+
+def set_sentence(key: str, state: dict[str, Any]) -> None:
+    caches["sentences"].set(key, state)
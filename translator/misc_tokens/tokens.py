@@ -24,7 +24,10 @@ def token_phrase(token: Token) -> Optional[AbstractPhrase]:
         if tag_tokens:
             for text in [token.norm_, token.lemma_, token.text]:
                 if text in tag_tokens:
-                    return tag_tokens[text]
+                    # translations modify phrases, so a fresh one is
+                    # built from the shared parse
+                    phrase = tag_tokens[text]
+                    return StrPhrase.from_node(phrase._node, phrase.lang)
     else:
         for lang_path in _base_path.glob(token.lang_):
             if not lang_path.is_dir():
@@ -1,3 +1,22 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
+from music21.tinyNotation import Converter
 
-# Create your tests here.
+from maas.speech import MaasContext
+from translator.cache import fingerprint
+
+
+class FingerprintTests(SimpleTestCase):
+    def fallback_context(self, notation: str) -> MaasContext:
+        return MaasContext(
+            lexeme_fallback=Converter(notation, makeNotation=False)
+            .parse()
+            .stream.flatten()
+        )
+
+    def test_tuplet_fallback(self):
+        ctx = self.fallback_context("trip{c8 d8 e8}")
+        key = fingerprint("text", ctx)
+        self.assertEqual(key, fingerprint("text", ctx))
+        self.assertNotEqual(
+            key, fingerprint("text", self.fallback_context("c8 d8 e8"))
+        )
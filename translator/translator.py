@@ -1,23 +1,38 @@
+from __future__ import annotations
+
+import math
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
-from itertools import chain, islice
-from typing import Generator, Optional, Tuple
+from functools import lru_cache
+from itertools import chain, islice, repeat
+from multiprocessing import get_context
+from typing import Any, Generator, Iterable, Optional, Tuple
 
+from django.conf import settings
+from django.db import connections
 from jangle.models import LanguageTag
-from music21.note import Rest
-from music21.spanner import Slur
 from music21.stream.base import Score, Stream
 from nltk.corpus.reader import Synset
-from spacy import load
+from spacy import blank, load
 from spacy.language import Language
 from spacy.tokens import Doc, Span, Token
 
 from carpet.base import AbstractPhrase, BasePhrase, Suffix
+from carpet.closure import closest_defined
+from carpet.index import synset_index, synset_key
+from carpet.models import Phrase, SynsetDef
 from carpet.parser import StrPhrase
-from carpet.models import SynsetDef
 from carpet.speech import CarpetSpeech, PitchChange
-from carpet.wordnet import wordnet
+from carpet.wordnet import related_synset_levels, wordnet
+from maas.events import EventStream, NoteEvent
 from maas.speech import MaasContext
+from translator.cache import (
+    data_version,
+    fingerprint,
+    get_sentence,
+    set_sentence,
+)
 from translator.misc_tokens import token_phrase
 from translator.models import SpacyLanguage
 
@@ -126,7 +141,17 @@ WORDNET_POS = {
     "ADJ": "a", # adds sat for en
 }
 
+NER_ANNOTATIONS = frozenset({"doc.ents", "token.ent_iob", "token.ent_type"})
+"""spaCy annotations only read when `TranslatorContext.use_ner` is set.
+Part-of-speech tags, morphology, lemmas and dependencies are always read.
+"""
+
+MODEL_KEY = "grove_model"
+"""`Doc.user_data` key of the name & version of the model which parsed it."""
+
 _spacy_cache: dict[int, Language] = {}
+# (model, unused annotations) -> names of components to disable
+_pipe_profiles: dict[tuple[Language, frozenset[str]], list[str]] = {}
 
 
 def synsets_to_int(synsets: list[Synset]) -> Optional[int]:
@@ -150,42 +175,66 @@ def token_groups(
             yield tokens
 
 
-def related_synsets(
-    synsets: list[tuple[Synset]],
-    hypernym_search_depth: int,
-    hyponym_search_depth: int,
-    yielded=[],
-) -> Generator[tuple[Synset], None, None]:
-    """Navigates hypernyms & hyponyms recursively"""
-    yield from synsets
-    yielded.extend(s[0] for s in synsets)
-
-    def related_chain(symbol: str) -> list[tuple]:
-        return list(
-            chain.from_iterable(
-                (
-                    (h, *s)
-                    for h in s[0]._related(symbol, False)
-                    if h not in yielded
-                )
-                for s in synsets
+def _synsets(lemma: str, pos: Optional[str], lang: str) -> list[Synset]:
+    synsets = wordnet.synsets(lemma, pos, lang)
+    if lang != "eng" and pos == wordnet.ADJ:
+        synsets += wordnet.synsets(lemma, wordnet.ADJ_SAT, lang)
+    return synsets
+
+
+@lru_cache(maxsize=settings.LEMMA_SYNSETS_CACHE_SIZE)
+def lemma_synsets(
+    lemma: str, pos: Optional[str], lang: str
+) -> tuple[Synset, ...]:
+    """Synsets of a lemma in a WordNet language,
+    falling back to alternative wordnets and English.
+    Memoized, see `lemma_synsets.cache_info` and `.cache_clear`.
+    """
+    synsets = _synsets(lemma, pos, lang)
+    for alt in ALT_WORDNETS.get(lang, []):
+        if synsets:
+            break
+        synsets = _synsets(lemma, pos, alt)
+    if lang != "eng" and not synsets:
+        synsets = _synsets(lemma, pos, "eng")
+    return tuple(synsets)
+
+
+def find_defined_synset(
+    levels: Iterable[list[tuple[Synset]]],
+) -> Tuple[Optional[AbstractPhrase], tuple[Synset]]:
+    """Finds the first synset with a definition, in search order.
+    Depending on `settings.SYNSET_SEARCH`, each level is resolved
+    against the in-memory synset index
+    or with a single query to the database.
+    """
+    batched = settings.SYNSET_SEARCH == "batched"
+    for level in levels:
+        if not level:
+            continue
+        if batched:
+            defs = list(
+                SynsetDef.objects.from_synsets(
+                    s[0] for s in level
+                ).values_list("pos", "wn_offset", "phrase", "phrase__compiled")
             )
-        )
-
-    if hypernym_search_depth > 0:
-        yield from related_synsets(
-            related_chain("@"),
-            hypernym_search_depth - 1,
-            hyponym_search_depth,
-            yielded,
-        )
-    if hyponym_search_depth > 0:
-        yield from related_synsets(
-            related_chain("~"),
-            hypernym_search_depth,
-            hyponym_search_depth - 1,
-            yielded,
-        )
+            trees = Phrase.objects.trees(
+                {phrase_id: compiled for *_, phrase_id, compiled in defs}
+            )
+            phrases = {
+                (pos, wn_offset): trees[phrase_id]
+                for pos, wn_offset, phrase_id, _ in defs
+            }
+            for synset in level:
+                phrase = phrases.get(synset_key(synset[0]))
+                if phrase is not None:
+                    return phrase, synset
+        else:
+            for synset in level:
+                phrase = synset_index.get_phrase(synset[0])
+                if phrase is not None:
+                    return phrase, synset
+    return None, tuple()
 
 
 def _pron_carpet(token: Token, spec_gender=False) -> str:
@@ -218,6 +267,12 @@ class TranslatorContext(MaasContext):
     hyponym_search_depth: int = 2
     wn_ic: dict = field(default_factory=dict)
 
+    def unused_annotations(self) -> frozenset[str]:
+        """spaCy annotations the translator won't read with this context."""
+        if self.use_ner:
+            return frozenset()
+        return NER_ANNOTATIONS
+
 
 class Translation(CarpetSpeech):
     ctx: TranslatorContext
@@ -230,17 +285,55 @@ class Translation(CarpetSpeech):
     def __init__(self, ctx: TranslatorContext, span: Span) -> None:
         super().__init__(ctx)
         self.span = span
-        self.stream = Stream()
         self.token_history = {}
         self.skipped_tokens = []
         self.merged_tokens = {}
         self._first_det_used = False
         self.translate_ents()
-        self.stream.append(self.token_to_stream(span.root))
+        self.events = self.token_to_events(span.root)
+
+    @property
+    def stream(self) -> Stream:
+        return self.ctx.build_stream(self.events)
 
     def score(self) -> Score:
         return self.ctx.build_score(self.span.text, self.stream)
 
+    def state(self) -> dict[str, Any]:
+        """Picklable output of the translation,
+        with tokens as indices into the span.
+        """
+        start = self.span.start
+        return {
+            "events": self.events,
+            "token_history": {
+                t.i - start: h for t, h in self.token_history.items()
+            },
+            "skipped_tokens": [t.i - start for t in self.skipped_tokens],
+            "merged_tokens": {
+                t.i - start: m.i - start for t, m in self.merged_tokens.items()
+            },
+        }
+
+    @classmethod
+    def restore(
+        cls, ctx: TranslatorContext, span: Span, state: dict[str, Any]
+    ) -> Translation:
+        """Rebuilds a translation of `span` from `Translation.state`."""
+        self = cls.__new__(cls)
+        CarpetSpeech.__init__(self, ctx)
+        self.span = span
+        self.events = state["events"]
+        self.token_history = {
+            span[i]: h for i, h in state["token_history"].items()
+        }
+        self.skipped_tokens = [span[i] for i in state["skipped_tokens"]]
+        self.merged_tokens = {
+            span[i]: span[m] for i, m in state["merged_tokens"].items()
+        }
+        self.ent_phrases = {}
+        return self
+
     def token_used(self, token: Token) -> bool:
         if token in self.merged_tokens:
             return True
@@ -262,24 +355,9 @@ class Translation(CarpetSpeech):
             if do_yield:
                 yield tokens
 
-    def _synsets(
-        self, lemma: str, pos: Optional[str], lang: str
-    ) -> list[Synset]:
-        synsets = wordnet.synsets(lemma, pos, lang)
-        if lang != "eng" and pos == wordnet.ADJ:
-            synsets += wordnet.synsets(lemma, wordnet.ADJ_SAT, lang)
-        return synsets
-
     def synsets(self, lemma: str, pos: Optional[str] = None) -> list[Synset]:
         lemma = lemma.strip().replace(" ", "_")
-        synsets = self._synsets(lemma, pos, self.ctx.wn_lang)
-        for alt in ALT_WORDNETS.get(self.ctx.wn_lang, []):
-            if synsets:
-                break
-            synsets = self._synsets(lemma, pos, alt)
-        if self.ctx.wn_lang != "eng" and not synsets:
-            synsets = self._synsets(lemma, pos, "eng")
-        return synsets
+        return list(lemma_synsets(lemma, pos, self.ctx.wn_lang))
 
     def potential_synset_lists(
         self, token: Token
@@ -304,22 +382,33 @@ class Translation(CarpetSpeech):
                 # pos might not be accurate for groups of tokens
                 yield self.synsets(text), tokens
 
-    def token_to_phrase_via_wn(
-        self, token: Token
-    ) -> Tuple[Optional[AbstractPhrase], list[Token], tuple[Synset]]:
-        for synsets, tokens in self.potential_synset_lists(token):
-            related = related_synsets(
+    def search_synsets(
+        self, synsets: list[Synset]
+    ) -> Tuple[Optional[AbstractPhrase], tuple[Synset]]:
+        """Searches synsets, their hypernyms & hyponyms for a definition."""
+        if settings.SYNSET_SEARCH == "closure":
+            found = closest_defined(
+                synsets,
+                self.ctx.hypernym_search_depth,
+                self.ctx.hyponym_search_depth,
+            )
+            if found is not None:
+                return found  # type: ignore
+        return find_defined_synset(
+            related_synset_levels(
                 list(zip(synsets)),
                 self.ctx.hypernym_search_depth,
                 self.ctx.hyponym_search_depth,
-                [],
             )
-            for synset in related:
-                try:
-                    def_ = SynsetDef.objects.get_from_synset(synset[0])
-                    return def_.phrase, tokens, synset
-                except SynsetDef.DoesNotExist:
-                    pass
+        )
+
+    def token_to_phrase_via_wn(
+        self, token: Token
+    ) -> Tuple[Optional[AbstractPhrase], list[Token], tuple[Synset]]:
+        for synsets, tokens in self.potential_synset_lists(token):
+            phrase, synset = self.search_synsets(synsets)
+            if phrase is not None:
+                return phrase, tokens, synset
         return None, [], tuple()
 
     def modify_phrase(
@@ -364,10 +453,10 @@ class Translation(CarpetSpeech):
                 modified = True
         return phrase, modified
 
-    def token_to_stream(self, token: Token) -> Stream:
+    def token_to_events(self, token: Token) -> EventStream:
         is_skipped = False
         phrase = None
-        root_m21_obj = None
+        root_events = None
         if self.token_used(token):
             pass
         elif token in chain.from_iterable(self.ent_phrases):
@@ -384,9 +473,13 @@ class Translation(CarpetSpeech):
             if token.has_morph:
                 punct_type = token.morph.get("PunctType")
                 if "Peri" in punct_type:
-                    root_m21_obj = Rest(self.ctx.peri_rest)
+                    root_events = EventStream(
+                        [NoteEvent(length=self.ctx.peri_rest)]
+                    )
                 elif "Comm" in punct_type:
-                    root_m21_obj = Rest(self.ctx.comm_rest)
+                    root_events = EventStream(
+                        [NoteEvent(length=self.ctx.comm_rest)]
+                    )
                 else:
                     is_skipped = True
         elif token.pos_ == "DET":
@@ -432,87 +525,236 @@ class Translation(CarpetSpeech):
         child_phrase_tokens = defaultdict(list)
         for child in token.children:
             child_phrase_tokens[child.dep_].append(child)
-        stream = Score()
+        parts: list[EventStream] = []
         for dep in DEP_ORDERING:
             if dep == "ROOT":
                 if phrase is not None:
-                    if len(stream) and token.dep_ in DOWN_ROOTS:
+                    if parts and token.dep_ in DOWN_ROOTS:
                         phrase.pitch_change = PitchChange.DOWN
                     elif token.dep_ in UP_DEPS:
                         if token.has_head() and token.dep_ != "ROOT":
                             phrase.pitch_change = PitchChange.UP
                     elif token.dep_ not in NEUTRAL_DEPS:
                         phrase.pitch_change = PitchChange.DOWN
-                    root_m21_obj = self.phrase_to_stream(phrase)
-                if root_m21_obj is not None:
-                    stream.append(root_m21_obj)
+                    root_events = self.phrase_to_events(phrase)
+                if root_events is not None:
+                    parts.append(root_events)
             else:
                 for child in child_phrase_tokens[dep]:
-                    stream.append(self.token_to_stream(child))
-        return stream.flatten()
+                    parts.append(self.token_to_events(child))
+        return EventStream.concat(parts)
+
+    def token_to_stream(self, token: Token) -> Stream:
+        return self.ctx.build_stream(self.token_to_events(token))
 
     def translate_ents(self) -> None:
         self.ent_phrases = {}
         if not self.ctx.use_ner:
             return
         for ent in self.span.ents:
-            phrase = None
-            synsets = list(zip(self.synsets(ent.text, wordnet.NOUN)))
+            synsets = self.synsets(ent.text, wordnet.NOUN)
             if self.ctx.sub_rel_ents:
-                synsets = related_synsets(
-                    synsets,
-                    self.ctx.hypernym_search_depth,
-                    self.ctx.hyponym_search_depth,
-                    [],
-                )
-            for synset in synsets:
-                try:
-                    phrase = SynsetDef.objects.get_from_synset(
-                        synset[0]
-                    ).phrase
-                    break
-                except SynsetDef.DoesNotExist:
-                    pass
+                phrase, _ = self.search_synsets(synsets)
+            else:
+                phrase, _ = find_defined_synset([list(zip(synsets))])
             if not phrase and ent.label_ in ENT_FALLBACKS:
                 phrase = StrPhrase(ENT_FALLBACKS[ent.label_])
             if phrase is not None:
                 self.ent_phrases[ent] = phrase
 
 
+def _load_spacy(spacy_lang: SpacyLanguage) -> Language:
+    nlp = _spacy_cache.get(spacy_lang.pk)
+    if nlp is None:
+        nlp = load(spacy_lang.name)
+        _spacy_cache[spacy_lang.pk] = nlp
+    return nlp
+
+
+def load_nlp(lang: LanguageTag) -> Language:
+    """Loads the largest downloaded spaCy model for a language, cached."""
+    spacy_lang = (
+        SpacyLanguage.objects.from_lang(lang).filter(downloaded=True).largest()
+    )
+    if spacy_lang is None:
+        raise ValueError(f"no spacy models downloaded for {lang}")
+    return _load_spacy(spacy_lang)
+
+
+def disabled_pipes(nlp: Language, unused: frozenset[str]) -> list[str]:
+    """Names of pipeline components which only assign unused annotations."""
+    key = (nlp, unused)
+    if key not in _pipe_profiles:
+        _pipe_profiles[key] = [
+            name
+            for name in nlp.pipe_names
+            if (assigns := nlp.get_pipe_meta(name).assigns)
+            and unused.issuperset(assigns)
+        ]
+    return _pipe_profiles[key]
+
+
+def preload_nlp() -> None:
+    """Loads the largest downloaded spaCy model of every language."""
+    downloaded = SpacyLanguage.objects.filter(downloaded=True)
+    for iso_lang in downloaded.values_list("iso_lang", flat=True).distinct():
+        spacy_lang = downloaded.filter(iso_lang=iso_lang).largest()
+        if spacy_lang is not None:
+            _load_spacy(spacy_lang)
+
+
+def _mark_model(nlp: Language, doc: Doc) -> Doc:
+    """Records the name & version of the model which parsed a doc,
+    as sentences parsed by another model are cached apart.
+    """
+    doc.user_data[MODEL_KEY] = (nlp.meta["name"], nlp.meta["version"])
+    return doc
+
+
+def _set_lang(
+    ctx: TranslatorContext, lang: LanguageTag, add_lyrics: bool
+) -> None:
+    if not (lang.lang and lang.lang.iso_lang):
+        raise ValueError(f"lang {lang} does not originate from ISO-639 3")
+    ctx.wn_lang = lang.lang.iso_lang.part_3
+    if add_lyrics:
+        ctx.lyrics_lang = lang
+
+
+def translate_sent(ctx: TranslatorContext, sent: Span) -> Translation:
+    """Translates a sentence, reusing cached translations
+    of the same text, language, context, spaCy model and data version.
+    """
+    if not settings.CACHE_SENTENCES:
+        return Translation(ctx, sent)
+    key = fingerprint(
+        data_version(),
+        sent.doc.user_data.get(MODEL_KEY),
+        sent.text,
+        sent.doc.lang_,
+        ctx,
+    )
+    state = get_sentence(key)
+    if state is not None:
+        return Translation.restore(ctx, sent, state)
+    speech = Translation(ctx, sent)
+    set_sentence(key, speech.state())
+    return speech
+
+
+def _translate_sents_in_worker(
+    ctx: TranslatorContext, lang: str, doc_bytes: bytes, start: int, stop: int
+) -> list[dict[str, Any]]:
+    """Translates sentences `start` to `stop` of a serialized doc
+    in a worker process, returning their `Translation.state`.
+    Translating reads only annotations serialized with the doc,
+    so a blank vocabulary of its language is enough to restore it.
+    """
+    doc = Doc(blank(lang).vocab).from_bytes(doc_bytes)
+    sents = list(doc.sents)[start:stop]
+    return [translate_sent(ctx, sent).state() for sent in sents]
+
+
+def translate_doc_events(
+    ctx: TranslatorContext, doc: Doc, workers=0
+) -> Tuple[EventStream, list[Translation]]:
+    """Translates sentences of a doc to note events.
+    With multiple `workers`, sentences are split into contiguous chunks
+    translated by a pool of processes, and reassembled in order.
+    """
+    sents = list(doc.sents)
+    if workers > 1 and len(sents) > 1:
+        chunk_size = math.ceil(len(sents) / workers)
+        starts = range(0, len(sents), chunk_size)
+        # forked workers must not share the parent's connection
+        connections.close_all()
+        with ProcessPoolExecutor(
+            len(starts), mp_context=get_context("fork")
+        ) as pool:
+            states = chain.from_iterable(
+                pool.map(
+                    _translate_sents_in_worker,
+                    repeat(ctx),
+                    repeat(doc.lang_),
+                    repeat(doc.to_bytes()),
+                    starts,
+                    (start + chunk_size for start in starts),
+                )
+            )
+            speeches = [
+                Translation.restore(ctx, sent, state)
+                for sent, state in zip(sents, states)
+            ]
+    else:
+        speeches = [translate_sent(ctx, sent) for sent in sents]
+    events = EventStream.concat(speech.events for speech in speeches)
+    if events:
+        last = events.events[-1]
+        if (
+            last.is_rest
+            and last.lyric is None
+            and not events.is_slurred(len(events) - 1)
+        ):
+            events.pop()
+    return events, speeches
+
+
+def translate_doc(
+    ctx: TranslatorContext, doc: Doc, workers=0
+) -> Tuple[Score, list[Translation]]:
+    """Translates sentences of a doc to a score."""
+    events, speeches = translate_doc_events(ctx, doc, workers)
+    return ctx.build_score(str(doc), ctx.build_stream(events)), speeches
+
+
+def _parse(
+    ctx: TranslatorContext, text: str | Doc, lang: LanguageTag, add_lyrics
+) -> Doc:
+    _set_lang(ctx, lang, add_lyrics)
+    nlp = load_nlp(lang)
+    disable = disabled_pipes(nlp, ctx.unused_annotations())
+    return _mark_model(nlp, nlp(text, disable=disable))
+
+
 # _ic = wordnet_ic.ic('ic-brown.dat')
 def translate(
     ctx: TranslatorContext,
     text: str | Doc,
     lang: LanguageTag,
     add_lyrics=True,
+    workers=0,
 ) -> Tuple[Score, list[Translation]]:
-    if not (lang.lang and lang.lang.iso_lang):
-        raise ValueError(f"lang {lang} does not originate from ISO-639 3")
-    ctx.wn_lang = lang.lang.iso_lang.part_3
-    if add_lyrics:
-        ctx.lyrics_lang = lang
-    spacy_lang = SpacyLanguage.objects.from_lang(lang).largest()
-    if spacy_lang is None:
-        raise ValueError(f"no spacy models downloaded for {lang}")
-    nlp = _spacy_cache.get(spacy_lang.pk)
-    if nlp is None:
-        nlp = load(spacy_lang.name)
-        _spacy_cache[spacy_lang.pk] = nlp
-    stream = Score()
-    doc = nlp(text)
-    speeches = []
-    for sent in doc.sents:
-        speech = Translation(ctx, sent)
-        stream.append(speech.stream)
-        speeches.append(speech)
-    stream = stream.flatten()
-    last = stream.last()
-    if isinstance(last, Rest) and len(last.lyrics) == 0:
-        has_slur = False
-        for spanner in last.getSpannerSites():
-            if isinstance(spanner, Slur):
-                has_slur = True
-                break
-        if not has_slur:
-            stream.pop(len(stream) - 1)
-    return ctx.build_score(str(doc), stream), speeches
+    return translate_doc(ctx, _parse(ctx, text, lang, add_lyrics), workers)
+
+
+def translate_events(
+    ctx: TranslatorContext,
+    text: str | Doc,
+    lang: LanguageTag,
+    add_lyrics=True,
+    workers=0,
+) -> Tuple[EventStream, list[Translation]]:
+    """Same as `translate`, without building a music21 score."""
+    doc = _parse(ctx, text, lang, add_lyrics)
+    return translate_doc_events(ctx, doc, workers)
+
+
+def translate_many(
+    ctx: TranslatorContext,
+    texts: Iterable[str],
+    lang: LanguageTag,
+    add_lyrics=True,
+    batch_size=64,
+    n_process=1,
+    workers=0,
+) -> Generator[Tuple[Score, list[Translation]], None, None]:
+    """Translates texts in order, batching them through spaCy's `nlp.pipe`."""
+    _set_lang(ctx, lang, add_lyrics)
+    nlp = load_nlp(lang)
+    for doc in nlp.pipe(
+        texts,
+        batch_size=batch_size,
+        disable=disabled_pipes(nlp, ctx.unused_annotations()),
+        n_process=n_process,
+    ):
+        yield translate_doc(ctx, _mark_model(nlp, doc), workers)
@@ -4,4 +4,5 @@ from translator import views
 urlpatterns = [
     path("", views.index, name="index"),
     path("mxl/<slug:filename>/", views.mxl, name="mxl"),
+    path("midi/<slug:filename>/", views.midi, name="midi"),
 ]
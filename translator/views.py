@@ -1,10 +1,12 @@
 import os
-import subprocess
-import uuid
+import tempfile
+from io import StringIO
+from typing import IO, Any, Callable, Optional
 
 from django.conf import settings
 from django.http import (
     FileResponse,
+    Http404,
     HttpRequest,
     JsonResponse,
 )
@@ -13,10 +15,174 @@ from django.urls import reverse
 from jangle.models import LanguageTag
 from music21.key import Key
 from music21.tinyNotation import Converter
+from spacy.tokens import Token
 
+import xml2abc_mod
+from maas.abc import render_abc
+from maas.events import EventStream
+from maas.layout import UnsupportedLayout
+from maas.midi import iter_midi
+from maas.musicxml import write_musicxml, write_mxl
+from maas.speech import MaasContext
+from translator.cache import (
+    data_version,
+    fingerprint,
+    get_result,
+    set_result,
+)
 from translator.forms import TranslationForm
 from translator.meta import get_supported_languages
-from translator.translator import TranslatorContext, translate
+from translator.translator import TranslatorContext, translate_events
+
+
+def _token_dict(token: Optional[Token]) -> Optional[dict[str, str]]:
+    if token is None:
+        return None
+    return {"text": token.text, "pos_": token.pos_}
+
+
+def _xml2abc(ctx: TranslatorContext, events: EventStream, title: str) -> str:
+    """ABC converted from MusicXML, for events `render_abc` can't lay out."""
+    musicxml = StringIO()
+    write_musicxml(ctx, events, title, musicxml)
+    return xml2abc_mod.convert(musicxml.getvalue().encode())
+
+
+def translate_to_abc(
+    ctx: TranslatorContext,
+    text: str,
+    lang: LanguageTag,
+    add_lyrics: bool,
+) -> dict[str, Any]:
+    """Translates text to ABC, returning it along with token histories,
+    and what `mxl` needs to write the score for download.
+    """
+    events, speeches = translate_events(
+        ctx,
+        text,
+        lang,
+        add_lyrics,
+        settings.TRANSLATOR_WORKERS,
+    )
+    histories = []
+    for speech in speeches:
+        for token in speech.span:
+            histories.append(
+                {
+                    "token": _token_dict(token),
+                    "history": speech.token_history.get(token),
+                    "skipped": token in speech.skipped_tokens,
+                    "merged_token": _token_dict(
+                        speech.merged_tokens.get(token)
+                    ),
+                }
+            )
+    try:
+        abc = render_abc(ctx, events, text)
+    except UnsupportedLayout:
+        abc = _xml2abc(ctx, events, text)
+    return {
+        "abc": abc,
+        "histories": histories,
+        "key": ctx.key,
+        "sizes": ctx.sizes,
+        "events": events,
+        "title": text,
+    }
+
+
+def translator_context(form: TranslationForm) -> TranslatorContext:
+    return TranslatorContext(
+        key=Key(form.cleaned_data["key"]),
+        use_ner=form.cleaned_data["use_ner"],
+        show_det=form.cleaned_data["show_det"],
+        write_slurs=form.cleaned_data["write_slurs"],
+        gender_pronouns=form.cleaned_data["gender_pronouns"],
+        sub_rel_ents=form.cleaned_data["sub_rel_ents"],
+        hypernym_search_depth=form.cleaned_data["hyper_search_depth"],
+        hyponym_search_depth=form.cleaned_data["hypo_search_depth"],
+        max_l_grouping=form.cleaned_data["max_l_grouping"],
+        max_r_grouping=form.cleaned_data["max_r_grouping"],
+        peri_rest=form.cleaned_data["peri_rest"],
+        comm_rest=form.cleaned_data["comm_rest"],
+        lexeme_fallback=Converter(
+            form.cleaned_data["lexeme_fallback"], makeNotation=False
+        )
+        .parse()
+        .stream.flatten(),
+    )
+
+
+def score_path(key: str, suffix: str) -> str:
+    """Path of a file written for the translation with `key`."""
+    return os.path.join(settings.M21_OUT_DIR, key + suffix)
+
+
+def write_score_file(path: str, write: Callable[[IO[bytes]], None]) -> None:
+    """Writes a file under `settings.M21_OUT_DIR`, which every worker reads.
+    Written to a temporary file first, so concurrent downloads
+    never read a partly written file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=settings.M21_OUT_DIR)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_mxl_file(key: str, result: dict[str, Any]) -> None:
+    path = score_path(key, ".mxl")
+    if os.path.exists(path):
+        return
+    ctx = MaasContext(key=result["key"], sizes=result["sizes"])
+    write_score_file(
+        path, lambda f: write_mxl(ctx, result["events"], result["title"], f)
+    )
+
+
+def write_midi_file(key: str, result: dict[str, Any]) -> None:
+    path = score_path(key, ".mid")
+    if os.path.exists(path):
+        return
+    ctx = MaasContext(key=result["key"], sizes=result["sizes"])
+    write_score_file(
+        path,
+        lambda f: f.writelines(
+            iter_midi(ctx, result["events"], result["title"])
+        ),
+    )
+
+
+def translate_form(
+    form: TranslationForm, lang: LanguageTag
+) -> tuple[str, dict[str, Any]]:
+    """Key & result of the translation a valid form asks for,
+    from the cache if it's there.
+    Its MXL & MIDI files are written along with it, for any worker to serve.
+    """
+    ctx = translator_context(form)
+    key = fingerprint(
+        data_version(),
+        form.cleaned_data["text"],
+        lang,
+        form.cleaned_data["add_lyrics"],
+        ctx,
+    )
+    result = get_result(key)
+    if result is None:
+        result = translate_to_abc(
+            ctx,
+            form.cleaned_data["text"],
+            lang,
+            form.cleaned_data["add_lyrics"],
+        )
+        set_result(key, result)
+    write_mxl_file(key, result)
+    write_midi_file(key, result)
+    return key, result
 
 
 def index(request: HttpRequest):
@@ -41,66 +207,18 @@ def index(request: HttpRequest):
             if langs[0] != lang:
                 langs.remove(lang)
                 langs.insert(0, lang)
-            ctx = TranslatorContext(
-                key=Key(form.cleaned_data["key"]),
-                use_ner=form.cleaned_data["use_ner"],
-                show_det=form.cleaned_data["show_det"],
-                write_slurs=form.cleaned_data["write_slurs"],
-                gender_pronouns=form.cleaned_data["gender_pronouns"],
-                sub_rel_ents=form.cleaned_data["sub_rel_ents"],
-                hypernym_search_depth=form.cleaned_data["hyper_search_depth"],
-                hyponym_search_depth=form.cleaned_data["hypo_search_depth"],
-                max_l_grouping=form.cleaned_data["max_l_grouping"],
-                max_r_grouping=form.cleaned_data["max_r_grouping"],
-                peri_rest=form.cleaned_data["peri_rest"],
-                comm_rest=form.cleaned_data["comm_rest"],
-                lexeme_fallback=Converter(
-                    form.cleaned_data["lexeme_fallback"], makeNotation=False
-                )
-                .parse()
-                .stream.flatten(),
-            )
-            score, speeches = translate(
-                ctx,
-                form.cleaned_data["text"],
-                lang,
-                form.cleaned_data["add_lyrics"],
+            key, result = translate_form(form, lang)
+            return render(
+                request,
+                "translator/index.html",
+                {
+                    "langs": langs,
+                    "abc": result["abc"],
+                    "histories": result["histories"],
+                    "mxl_url": reverse("mxl", args=[key]),
+                    "midi_url": reverse("midi", args=[key]),
+                },
             )
-            histories = []
-            for speech in speeches:
-                for token in speech.span:
-                    histories.append(
-                        {
-                            "token": token,
-                            "history": speech.token_history.get(token),
-                            "skipped": token in speech.skipped_tokens,
-                            "merged_token": speech.merged_tokens.get(token),
-                        }
-                    )
-
-            uuid4 = str(uuid.uuid4())
-            path = os.path.join(settings.M21_OUT_DIR, uuid4)
-            mxl_path = score.write("mxl", path)
-            subprocess.call(
-                [
-                    "python3",
-                    settings.BASE_DIR / "xml2abc_mod.py",
-                    str(mxl_path),
-                    "-o",
-                    settings.M21_OUT_DIR,
-                ]
-            )
-            with open(path + ".abc") as f:
-                return render(
-                    request,
-                    "translator/index.html",
-                    {
-                        "langs": langs,
-                        "abc": f.read(),
-                        "histories": histories,
-                        "mxl_url": f"/mxl/{uuid4}/",  # TODO: use reverse
-                    },
-                )
         else:
             return JsonResponse(form.errors)
 
@@ -112,11 +230,20 @@ def index(request: HttpRequest):
 
 
 def mxl(request: HttpRequest, filename):
-    filename += ".mxl"
-    path = os.path.join(settings.M21_OUT_DIR, filename)
-    response = FileResponse(
-        open(path, "rb"),
-        as_attachment=True,
-        filename=filename,
+    """Downloads the MXL file written with a translation."""
+    try:
+        file = open(score_path(filename, ".mxl"), "rb")
+    except FileNotFoundError as e:
+        raise Http404("translation expired") from e
+    return FileResponse(file, as_attachment=True, filename=filename + ".mxl")
+
+
+def midi(request: HttpRequest, filename):
+    """Streams the MIDI file written with a translation."""
+    try:
+        file = open(score_path(filename, ".mid"), "rb")
+    except FileNotFoundError as e:
+        raise Http404("translation expired") from e
+    return FileResponse(
+        file, content_type="audio/midi", filename=filename + ".mid"
     )
-    return response
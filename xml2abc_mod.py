@@ -19,7 +19,10 @@ try:
 except:
     import xml.etree.ElementTree as E
 import os, sys, types, re, math
+from io import BytesIO
+from optparse import OptionParser
 from typing import Optional, Tuple, Any
+from zipfile import ZipFile, is_zipfile
 
 VERSION = 143
 
@@ -200,7 +203,9 @@ class Counter:
 
 
 class Music:
-    def __init__(self, options):
+    def __init__(self, options, abc_out: "ABCOutput"):
+        self.abc_out = abc_out
+        """the ABC output of the tune"""
         self.time = 0
         """the current time"""
         self.max_time = 0
@@ -403,13 +408,13 @@ class Music:
             if self.counter.getv("note", voice) == 0:
                 # no real notes counted in this voice
                 continue  # skip empty voices
-            if abc_out.denL:
-                unit_l = abc_out.denL
+            if self.abc_out.denL:
+                unit_l = self.abc_out.denL
                 # take the unit length from the -d option
             else:
                 unit_l = compute_unit_length(voice, self.g_measures, divs)
                 # compute the best unit length for this voice
-            abc_out.cmpL.append(unit_l)  # remember for header output
+            self.abc_out.cmpL.append(unit_l)  # remember for header output
             vn, vl = ([], {})
             # for voice voice: collect all notes to vn and all lyric lines to vl
             for im in range(len(self.g_measures)):
@@ -430,12 +435,12 @@ class Music:
                 # fill up possibly empty lyric measures at the end
                 missing = len(vn) - len(lyrics)
                 lyrics += missing * [""]
-            abc_out.add(f"V:{self.voice_count}")
+            self.abc_out.add(f"V:{self.voice_count}")
             if self.repbra:
                 if self.no_volta == 1 and self.voice_count > 1:
-                    abc_out.add("I:repbra 0")  # only volta on first voice
+                    self.abc_out.add("I:repbra 0")  # only volta on first voice
                 if self.no_volta == 2 and voice > min_voice:
-                    abc_out.add("I:repbra 0")
+                    self.abc_out.add("I:repbra 0")
                     # only volta on first voice of each part
             if self.chars_per_line > 0:
                 self.bars_per_line = 0
@@ -457,12 +462,12 @@ class Music:
                     chunk += vn[ib]
                     ib += 1
                 bar_num += ib
-                abc_out.add(f"{chunk} %%{bar_num}")  # line with barnumer
+                self.abc_out.add(f"{chunk} %%{bar_num}")  # line with barnumer
                 del vn[:ib]  # chop ib bars
                 lyric_lines = sorted(vl.items())
                 # order the numbered lyric lines for output
                 for n, lyrics in lyric_lines:
-                    abc_out.add("w: " + "|".join(lyrics[:ib]) + "|")
+                    self.abc_out.add("w: " + "|".join(lyrics[:ib]) + "|")
                     del lyrics[:ib]
             xml2abcmap[voice] = self.voice_count
             # XML voice number -> ABC voice number
@@ -506,11 +511,6 @@ class ABCOutput:
         self.tstep = options.t  # translate perc_map to voicemap
         self.stemless = False  # use U:s=!stemless!
         self.shift_stems = options.s  # shift note heads 3 units left
-        if out_path:
-            _, base_name = os.path.split(name)
-            self.out_file = open(os.path.join(out_path, base_name), "w")
-        else:
-            self.out_file = sys.stdout
         if self.javascript:
             self.X = 1  # always X:1 in javascript version
         self.pageFmt = {}
@@ -593,7 +593,6 @@ class ABCOutput:
             dmap = list(midimap[vnum - 1])[
                 4:
             ]  # map of abc percussion notes to MIDI notes
-            print(dmap)
             if dmap and "perc" not in clef:
                 clef = (clef + " map=perc").strip()
             hd.append("V:%d %s %s\n" % (vnum, clef, clfnms.get(vnum, "")))
@@ -655,19 +654,25 @@ class ABCOutput:
             # javascript compatibility
             self.abc_out = tbs + ks + ["</defs>\n%%endsvg\n"] + self.abc_out
 
-    def write_all(self):
-        """determine the required encoding of the entire ABC output"""
+    def get_string(self) -> str:
+        """the entire ABC output"""
         string = "".join(self.abc_out)
         if self.dojef:
             string = perc2map(string)
-        if python3:
-            self.out_file.write(string)
-        else:
-            self.out_file.write(string.encode("utf-8"))  # type: ignore
+        return string
+
+    def write_all(self):
+        """write the ABC output to a file in out_path, or to stdout"""
+        string = self.get_string()
+        if not python3:
+            string = string.encode("utf-8")  # type: ignore
         if self.out_path:
-            self.out_file.close()  # close each file with -o option
+            _, base_name = os.path.split(self.name)
+            with open(os.path.join(self.out_path, base_name), "w") as out_file:
+                out_file.write(string)
         else:
-            self.out_file.write("\n")  # add empty line between tunes on stdout
+            sys.stdout.write(string)
+            sys.stdout.write("\n")  # add empty line between tunes on stdout
         info(
             "%s written with %d voices" % (self.name, len(self.clefs)),
             warn=False,
@@ -748,15 +753,15 @@ def abc_to_midi_pitch(note: str) -> int:
     if not r:
         return -1
     acc, note, octave = r.groups()
-    nUp = n.upper()
+    nUp = note.upper()
     p = (
         60
         + [0, 2, 4, 5, 7, 9, 11]["CDEFGAB".index(nUp)]
-        + (12 if nUp != n else 0)
+        + (12 if nUp != note else 0)
     )
     if acc:
         p += (1 if acc[0] == "^" else -1) * len(acc)
-    if oct:
+    if octave:
         p += (12 if octave[0] == "'" else -12) * len(octave)
     return p
 
@@ -1337,12 +1342,14 @@ class Parser:
     midi_defaults: list[int]
     """default MIDI settings for channel, program, volume, panning"""
 
-    def __init__(self, options):
+    def __init__(self, options, abc_out: "ABCOutput"):
         """unfold repeats, number of chars per line, credit filter level, volta option"""
+        self.abc_out = abc_out
+        """the ABC output of the tune"""
         self.slur_buffer = {}
         self.dirStk = {}
         self.is_in_grace = False
-        self.music = Music(options)
+        self.music = Music(options, abc_out)
         self.unfold = options.u
         self.ctf = options.c
         self.g_staff_map = []
@@ -1402,13 +1409,13 @@ class Parser:
         is_grace: bool,
         stop_grace: bool,
     ) -> None:
-        """Match slur number n in voice v2, add ABC code to before/after."""
+        """Match slur number num in voice v2, add ABC code to before/after."""
         if type2 not in ["start", "stop"]:
             return  # slur type continue has no ABC equivalent
         if num is None:
             num = "1"
         if num in self.slur_buffer:
-            type1, voice1, note1, grace1 = self.slur_buffer[n]
+            type1, voice1, note1, grace1 = self.slur_buffer[num]
             if type2 != type1:  # slur complete, now check the voice
                 if (
                     voice2 == voice1
@@ -1420,22 +1427,22 @@ class Parser:
                         ] + note1.before  # keep left-right order!
                         note2.after += ")"
                     # no else: don't bother with reversed stave spanning slurs
-                del self.slur_buffer[n]  # slur finished, remove from stack
+                del self.slur_buffer[num]  # slur finished, remove from stack
             else:  # double definition, keep the last
                 info(
                     "double slur numbers %s-%s in part %d, measure %d, voice %d note %s, first discarded"
                     % (
                         type2,
-                        n,
+                        num,
                         self.measure.ixp + 1,
                         self.measure.ixm + 1,
                         voice2,
                         note2.notes,
                     )
                 )
-                self.slur_buffer[n] = (type2, voice2, note2, is_grace)
+                self.slur_buffer[num] = (type2, voice2, note2, is_grace)
         else:  # unmatched slur, put in dict
-            self.slur_buffer[n] = (type2, voice2, note2, is_grace)
+            self.slur_buffer[num] = (type2, voice2, note2, is_grace)
 
     def do_notations(self, note: Note, notation: E.Element, is_tab: bool):
         for key, val in self.ornaments:
@@ -1666,7 +1673,7 @@ class Parser:
             and (not is_tab or voice in self.has_stems or self.tstep)
         ):
             note.before += ["s"]
-            abc_out.stemless = True
+            self.abc_out.stemless = True
         accidental = n.find("accidental")
         if accidental is not None and accidental.get("parentheses") == "yes":
             note.ntdec += "!courtesy!"
@@ -1769,16 +1776,16 @@ class Parser:
             key, self.msralts = set_key(
                 int(fifths), e.findtext("key/mode", "major")
             )
-            if first and not steps and abc_out.key == "none":
-                abc_out.key = key  # first measure -> header, if not transposing instrument or percussion part!
-            elif key != abc_out.key or not first:
+            if first and not steps and self.abc_out.key == "none":
+                self.abc_out.key = key  # first measure -> header, if not transposing instrument or percussion part!
+            elif key != self.abc_out.key or not first:
                 self.measure.attr += f"[K:{key}]"  # otherwise -> voice
         beats = e.findtext("time/beats")
         if beats:
             unit = e.findtext("time/beat-type")
             meter = beats + "/" + unit
             if first:
-                abc_out.meter = meter  # first measure -> header
+                self.abc_out.meter = meter  # first measure -> header
             else:
                 self.measure.attr += f"[M:{meter}]"  # otherwise -> voice
             self.measure.meter = int(beats), int(unit)
@@ -2004,7 +2011,7 @@ class Parser:
                 if vids:
                     vs = vids[0]
                     # direction for the indentified voice, not the staff
-                if abc_out.vol_pan > 0:
+                if self.abc_out.vol_pan > 0:
                     parm, instr = (
                         ("program", str(int(prg) - 1))
                         if prg
@@ -2091,8 +2098,8 @@ class Parser:
             # hope it is a number and insert in voice 1
             if self.music.time == 0 and self.measure.ixm == 0:
                 # first measure -> header
-                abc_out.tempo = tempo
-                abc_out.tempo_units = tempo_units
+                self.abc_out.tempo = tempo
+                self.abc_out.tempo_units = tempo_units
             else:
                 self.music.append_element(
                     v1, f"[Q:{tempo_units[0]}/{tempo_units[1]}={tempo}]"
@@ -2294,7 +2301,7 @@ class Parser:
         for lyricist in lyricists:
             title_lines.append("Z:" + lyricist)
         if title_lines:
-            abc_out.title = "\n".join(title_lines)
+            self.abc_out.title = "\n".join(title_lines)
         self.is_sib = "Sibelius" in (
             element_tree.findtext("identification/encoding/software") or ""
         )
@@ -2316,7 +2323,7 @@ class Parser:
         space = 10 * xml_scale  # space between staff lines == 10 tenths
         abcScale = space / 0.2117
         # 0.2117 cm = 6pt = space between staff lines for scale = 1.0 in abcm2ps
-        abc_out.pageFmt["scale"] = abcScale
+        self.abc_out.pageFmt["scale"] = abcScale
         eks = 2 * ["page-layout/"] + 4 * ["page-layout/page-margins/"]
         eks = [
             a + b
@@ -2329,12 +2336,12 @@ class Parser:
         ]
         for i in range(6):
             v = defaults.findtext(eks[i])
-            k = abc_out.pagekeys[
+            k = self.abc_out.pagekeys[
                 i + 1
             ]  # pagekeys [0] == scale already done, skip it
-            if not abc_out.pageFmt[k] and v:
+            if not self.abc_out.pageFmt[k] and v:
                 try:
-                    abc_out.pageFmt[k] = float(v) * xml_scale  # -> cm
+                    self.abc_out.pageFmt[k] = float(v) * xml_scale  # -> cm
                 except:
                     info("illegal value %s for XML element %s" % (v, eks[i]))
                     continue  # just skip illegal values
@@ -2412,7 +2419,7 @@ class Parser:
                             clef_attr += (
                                 " diafret"  # for all voices in the part
                             )
-                    abc_out.clefs[iv] = clef + clef_attr
+                    self.abc_out.clefs[iv] = clef + clef_attr
                     # add nostems when all notes of voice had no stem
         self.g_staff_map.append(part)
 
@@ -2462,7 +2469,8 @@ class Parser:
             self.tab_voice_map[vabc] = xs
             self.heads[fret] = 1  # collect noteheads for SVG defs
 
-    def parse(self, fobj):
+    def parse(self, fobj) -> bool:
+        """parse file fobj into the ABC output, false if it has no notes"""
         vvmapAll = {}  # collect XML->ABC voice maps (xml2abcmap) of all parts
         e = E.parse(fobj)
         self.make_title(e)
@@ -2549,26 +2557,20 @@ class Parser:
             self.add_midi_map(ip, xml2abcmap)
             vvmapAll.update(xml2abcmap)
         if vvmapAll:  # skip output if no part has any notes
-            abc_out.make_header(
+            self.abc_out.make_header(
                 self.g_staff_map,
                 partlist,
                 self.midi_map,
                 self.tab_voice_map,
                 self.heads,
             )
-            abc_out.write_all()
-        else:
-            info("nothing written, %s has no notes ..." % abc_out.name)
+            return True
+        info("nothing written, %s has no notes ..." % self.abc_out.name)
+        return False
 
 
-# ----------------
-# Main Program
-# ----------------
-if __name__ == "__main__":
-    from optparse import OptionParser
-    from glob import glob
-    from zipfile import ZipFile
-
+def make_option_parser() -> OptionParser:
+    """command line options, also the defaults of convert"""
     ustr = "%prog [-h] [-u] [-m] [-c C] [-d D] [-n CPL] [-b BPL] [-o DIR] [-v V]\n"
     ustr += "[-x] [-p PFMT] [-t] [-s] [-i] [--v1] [--noped] [--stems] <file1> [<file2> ...]"
     parser = OptionParser(usage=ustr, version=str(VERSION))
@@ -2671,6 +2673,47 @@ if __name__ == "__main__":
     parser.add_option(
         "-i", action="store_true", help="read XML file from standard input"
     )
+    return parser
+
+
+def open_mxl(z: ZipFile):
+    """open the MusicXML file in an MXL archive"""
+    for n in z.namelist():
+        # assume there is always an XML file in a mxl archive !!
+        if (n[:4] != "META") and (n[-3:].lower() in {"xml"}):
+            return z.open(n)  # assume only one MusicXML file per archive
+    raise ValueError("no MusicXML file in MXL archive")
+
+
+def convert(source, X=0, name="stdin.xml", **options) -> str:
+    """Convert MusicXML, or compressed MusicXML (MXL), to ABC in memory.
+    source is bytes or a binary file object, options are named as
+    the destinations of the command line options, e.g. d=8 for -d 8"""
+    values, _ = make_option_parser().parse_args([])
+    for k, v in options.items():
+        setattr(values, k, v)
+    if isinstance(values.p, str):
+        values.p = values.p and values.p.split(",") or []
+    if isinstance(source, bytes):
+        source = BytesIO(source)
+    if is_zipfile(source):
+        source = open_mxl(ZipFile(source))
+    else:
+        source.seek(0)
+    abc_out = ABCOutput(name, "", X, values)
+    parser = Parser(values, abc_out)
+    if not parser.parse(source):
+        return ""
+    return abc_out.get_string()
+
+
+# ----------------
+# Main Program
+# ----------------
+if __name__ == "__main__":
+    from glob import glob
+
+    parser = make_option_parser()
     options, args = parser.parse_args()
     if options.n < 0:
         parser.error("only values >= 0")
@@ -2710,20 +2753,16 @@ if __name__ == "__main__":
         if name == "stdin.xml":
             fobj = sys.stdin
         elif ext.lower() == ".mxl":  # extract .XML file from .mxl file
-            z = ZipFile(name)
-            for n in z.namelist():
-                # assume there is always an XML file in a mxl archive !!
-                if (n[:4] != "META") and (n[-3:].lower() in {"xml"}):
-                    fobj = z.open(n)
-                    break  # assume only one MusicXML file per archive
+            fobj = open_mxl(ZipFile(name))
         else:
             fobj = open(name, "rb")  # open regular XML file
 
         abc_out = ABCOutput(fnm + ".abc", out_path, X, options)
-        # create global ABC output object
-        parser = Parser(options)  # XML parser
+        # create ABC output object
+        parser = Parser(options, abc_out)  # XML parser
         try:
-            parser.parse(fobj)  # parse file fobj and write ABC to <fnm>.abc
+            if parser.parse(fobj):  # parse file fobj
+                abc_out.write_all()  # and write ABC to <fnm>.abc
         except Exception as e:
             etype, value, traceback = sys.exc_info()  # works in python 2 & 3
             # info("** %s occurred: %s in %s" % (etype, value, name), False)